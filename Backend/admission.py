@@ -0,0 +1,165 @@
+# admission.py - Per-endpoint concurrency limits and load shedding for the model endpoints
+
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from config import Settings, settings
+
+
+class AdmissionRejected(Exception):
+    """A request was shed instead of admitted."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """
+    Caps how many requests of one kind run at once, with a bounded wait queue.
+
+    Up to `max_concurrent` requests hold a slot; up to `max_queue` more wait
+    for one, each for at most `queue_timeout_ms`. Anything beyond that fails
+    fast: 429 when the queue is already full, 503 when a queued request times
+    out. `max_concurrent <= 0` turns the limit off.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 queue_timeout_ms: float = 5000.0, retry_after_seconds: int = 2):
+        self.name = name
+        self.max_concurrent = int(max_concurrent)
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = max(0.0, float(queue_timeout_ms)) / 1000.0
+        self.retry_after_seconds = int(retry_after_seconds)
+        self._slots = asyncio.Semaphore(self.max_concurrent) if self.enabled else None
+
+        # Stats
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_wait_ms = 0.0
+        self._total_queue_wait_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if allowed. Raises AdmissionRejected."""
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        if self._slots.locked() or self.queued:
+            if self.queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected(429, f"Too many {self.name} requests queued ({self.queued})")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise AdmissionRejected(503, f"No {self.name} slot freed up within {self.queue_timeout * 1000:.0f} ms")
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+
+        wait_ms = (time.perf_counter() - started) * 1000.0
+        self.active += 1
+        self.admitted += 1
+        self._total_queue_wait_ms += wait_ms
+        self.max_queue_wait_ms = max(self.max_queue_wait_ms, wait_ms)
+
+    def release(self):
+        if not self.enabled:
+            return
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_queue_wait_ms": self._total_queue_wait_ms / self.admitted if self.admitted else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait_ms,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that admits POSTs under a path prefix through its controller.
+
+    Runs before the body is read, so shed requests cost no upload parsing,
+    and holds the slot until the response (streaming ones included) is sent.
+    """
+
+    def __init__(self, app, rules: List[Tuple[str, AdmissionController]]):
+        self.app = app
+        # Longest prefix wins
+        self.rules = sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+    def controller_for(self, path: str) -> Optional[AdmissionController]:
+        for prefix, controller in self.rules:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return controller
+        return None
+
+    async def __call__(self, scope, receive, send):
+        controller = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            controller = self.controller_for(scope["path"])
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await controller.acquire()
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={"error": "Server busy", "message": str(e)},
+                headers={"Retry-After": str(controller.retry_after_seconds)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release()
+
+
+def build_admission_controllers(config: Settings) -> dict:
+    """One controller per model endpoint group, from the ADMISSION_* settings."""
+    return {
+        "mri": AdmissionController(
+            "mri", config.ADMISSION_MRI_MAX_CONCURRENT, config.ADMISSION_MRI_MAX_QUEUE,
+            config.ADMISSION_QUEUE_TIMEOUT_MS, config.ADMISSION_RETRY_AFTER_SECONDS
+        ),
+        "ckd": AdmissionController(
+            "ckd", config.ADMISSION_CKD_MAX_CONCURRENT, config.ADMISSION_CKD_MAX_QUEUE,
+            config.ADMISSION_QUEUE_TIMEOUT_MS, config.ADMISSION_RETRY_AFTER_SECONDS
+        ),
+        "ascvd": AdmissionController(
+            "ascvd", config.ADMISSION_ASCVD_MAX_CONCURRENT, config.ADMISSION_ASCVD_MAX_QUEUE,
+            config.ADMISSION_QUEUE_TIMEOUT_MS, config.ADMISSION_RETRY_AFTER_SECONDS
+        ),
+    }
+
+
+ADMISSION_CONTROLLERS = build_admission_controllers(settings)
+
+
+def admission_stats() -> dict:
+    return {name: controller.stats() for name, controller in ADMISSION_CONTROLLERS.items()}
@@ -1,25 +1,46 @@
+import asyncio
+import io
+import json
 import os
-import shutil
-import time
-from typing import Dict
+import threading
+from typing import Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 import joblib
-import requests
-from fastapi import FastAPI, APIRouter, UploadFile, File
+import httpx
+from fastapi import FastAPI, APIRouter, UploadFile, File, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.formparsers import MultiPartParser
 
-# --- FIX: Removed TFSMLayer import which was causing the crash ---
-# from keras.layers import TFSMLayer 
-from keras.preprocessing.image import load_img, img_to_array
-import tensorflow as tf  # Added explicit TF import
+# TensorFlow is imported inside the MRI helpers, so the server can start
+# (and serve CKD/ASCVD) while the MRI model is still loading.
 
 # Import database and auth
-from db import init_db, check_db_connection
-from auth import auth_router
+from sqlalchemy.ext.asyncio import AsyncSession
+from db import (
+    init_db, check_db_connection, close_async_engine, get_async_db,
+    get_user_analysis_history_page_async, get_user_analysis_summaries_async
+)
+from auth import auth_router, token_cache_stats, get_current_user, get_optional_user, CurrentUser
+from batching import MicroBatcher
+from cache import PredictionCache, StaleWhileRevalidateCache
+from recommendations import RecommendationRegistry, dump_json
+from http_client import get_with_retries, close_http_clients
+from passwords import password_pool_stats, shutdown_password_pool
+from executors import get_executor, run_inference, executor_stats, shutdown_executors
+from model_loader import MODEL_LOADER
+from mri_runtime import load_mri_runner, MRI_RUNTIME, MRI_TFLITE_QUANTIZATION
+from preprocessing import BatchAssembler, decode_image
+from inference_worker import (
+    InferenceClient, InferenceWorkerUnavailable, INFERENCE_WORKER_SOCKETS, INFERENCE_WORKER_AUTHKEY,
+    INFERENCE_WORKER_TIMEOUT_SECONDS, INFERENCE_WORKER_READY_TIMEOUT_SECONDS, INFERENCE_WORKER_HEARTBEAT_SECONDS
+)
+from history import HISTORY_WRITER
+from admission import ADMISSION_CONTROLLERS, AdmissionMiddleware, admission_stats
+from jobs import JOB_MANAGER, JobQueueFull
 
 # -------------------------
 # Config
@@ -30,23 +51,77 @@ CKD_SCALER_PATH = os.path.join(CKD_MODEL_DIR, "data_scaler.joblib")
 CKD_DIAGNOSIS_PATH = os.path.join(CKD_MODEL_DIR, "ckd_diagnosis_model.joblib")
 CKD_STAGE_PATH = os.path.join(CKD_MODEL_DIR, "ckd_stage_model.joblib")
 ASCVD_MODEL_PATH = os.path.join(os.path.dirname(__file__), "ASCVD_Risk_Estimator.pkl")
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# joblib memory-maps large NumPy arrays in the CKD/ASCVD models ('r' = read-only, '' = load into memory),
+# so every worker process shares one copy through the page cache
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "r") or None
+
+# 'local' runs the models in this process; 'remote' sends inference to inference_worker.py processes
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "local")
+INFERENCE_CLIENT = InferenceClient(
+    INFERENCE_WORKER_SOCKETS,
+    INFERENCE_WORKER_AUTHKEY,
+    timeout=INFERENCE_WORKER_TIMEOUT_SECONDS,
+    heartbeat_seconds=INFERENCE_WORKER_HEARTBEAT_SECONDS,
+) if INFERENCE_BACKEND == "remote" else None
+
+# Uploads up to this size stay in memory; larger ones spill to an anonymous temp file
+UPLOAD_MEMORY_MAX_BYTES = int(os.getenv("UPLOAD_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+MultiPartParser.max_file_size = UPLOAD_MEMORY_MAX_BYTES
 
 CLASS_DICT: Dict[int, str] = {0: 'Glioma', 1: 'Meningioma', 2: 'No Tumor', 3: 'Pituitary'}
 MRI_MODEL = None
+MRI_MODEL_VERSION = "unloaded"
 CKD_SCALER = None
 CKD_DIAGNOSIS_MODEL = None
 CKD_STAGE_MODEL = None
 CKD_MODEL_READY = False
 ASCVD_MODEL = None
 ASCVD_MODEL_READY = False
+ASCVD_BATCH_MAX_ROWS = int(os.getenv("ASCVD_BATCH_MAX_ROWS", "10000"))
+ASCVD_FEATURE_INDEX = None  # column reorder for the model, if it differs from ASCVD_FEATURE_COLUMNS
+ASCVD_FEATURE_NAMES = None  # the model's fitted column names, if it was fitted on a DataFrame
 
 # CKD Feature Order
 FEATURE_ORDER = ['gfr', 'c3_c4', 'blood_pressure', 'serum_creatinine', 'serum_calcium', 'bun', 'urine_ph', 'oxalate_levels']
 
+# ASCVD input fields (request order) and the model's feature columns
+ASCVD_INPUT_FIELDS = ['blood_glucose', 'HbA1C', 'Systolic_BP', 'Diastolic_BP', 'LDL', 'HDL', 'Triglycerides', 'Haemoglobin', 'MCV']
+ASCVD_FEATURE_COLUMNS = [field.lower() for field in ASCVD_INPUT_FIELDS] + [
+    'glucose_hba1c_ratio', 'pulse_pressure', 'MAP', 'hypertension_flag', 'total_cholesterol',
+    'ldl_hdl_ratio', 'tg_hdl_ratio', 'non_hdl', 'anaemia_flag', 'microcytosis_flag',
+    'hb_mcv_ratio', 'risk_score'
+]
+
 # API Key read from the environment variable specified by the user
 GNEWS_API_KEY = os.getenv("GNEWS_API_KEY")
+# Upstream news endpoint (point at a local stub for tests)
+NEWS_API_URL = os.getenv("NEWS_API_URL", "https://newsapi.org/v2/top-headlines")
+
+# News cache: fresh for TTL, then served stale while one refresh runs
+NEWS_CACHE_TTL_SECONDS = float(os.getenv("NEWS_CACHE_TTL_SECONDS", "300"))
+NEWS_CACHE_STALE_SECONDS = float(os.getenv("NEWS_CACHE_STALE_SECONDS", "3600"))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", "256"))
+
+# MRI micro-batching (collect concurrent uploads into one model call)
+MRI_BATCH_MAX_SIZE = int(os.getenv("MRI_BATCH_MAX_SIZE", "16"))
+MRI_INPUT_SIZE = (128, 128)
+MRI_BATCH_MAX_WAIT_MS = float(os.getenv("MRI_BATCH_MAX_WAIT_MS", "10"))
+MRI_BATCH_MAX_INFLIGHT = int(os.getenv("MRI_BATCH_MAX_INFLIGHT", "1"))
+# Most slices accepted by one /api/rays/mri/study upload
+MRI_STUDY_MAX_SLICES = int(os.getenv("MRI_STUDY_MAX_SLICES", "256"))
+
+# Rows per chunk when streaming very large CKD CSV uploads
+CKD_STREAM_CHUNK_ROWS = int(os.getenv("CKD_STREAM_CHUNK_ROWS", "50000"))
+CKD_STREAM_MAX_CHUNK_ROWS = int(os.getenv("CKD_STREAM_MAX_CHUNK_ROWS", "200000"))
+
+# MRI prediction cache (keyed by upload hash + model version)
+MRI_CACHE_MAX_ENTRIES = int(os.getenv("MRI_CACHE_MAX_ENTRIES", "1024"))
+MRI_CACHE_TTL_SECONDS = float(os.getenv("MRI_CACHE_TTL_SECONDS", "86400"))
+MRI_CACHE_DIR = os.getenv("MRI_CACHE_DIR")  # optional persistent tier, e.g. /app/cache/mri
+MRI_CACHE_DIR_MAX_ENTRIES = int(os.getenv("MRI_CACHE_DIR_MAX_ENTRIES", "100000"))
+
+# ASCVD disease map and recommendations, loaded once from recommendations.json
+RECOMMENDATIONS = RecommendationRegistry.load()
 
 # -------------------------
 # Pydantic Models
@@ -68,70 +143,181 @@ class ASCVDRiskInput(BaseModel):
 app = FastAPI(title="HealthAI Backend")
 router = APIRouter()
 
+# Shed load on the model endpoints before their uploads are even read (see admission.py).
+# Added before CORS so rejections still carry CORS headers.
+app.add_middleware(
+    AdmissionMiddleware,
+    rules=[
+        ("/api/rays/mri", ADMISSION_CONTROLLERS["mri"]),
+        ("/api/analysis/ckd", ADMISSION_CONTROLLERS["ckd"]),
+        ("/api/analysis/ascvd-risk", ADMISSION_CONTROLLERS["ascvd"]),
+    ]
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Adjust in prod!
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients back off as told by 429/503 responses
+    expose_headers=["Retry-After"],
 )
 
 # -------------------------
 # Helper Functions (MRI Model)
 # -------------------------
+def get_mri_model_version() -> str:
+    """Identify the MRI model on disk (MRI_MODEL_VERSION env, else saved_model.pb size + mtime)."""
+    version = os.getenv("MRI_MODEL_VERSION")
+    if version:
+        return version
+    try:
+        stat = os.stat(os.path.join(MODEL_DIR, "saved_model.pb"))
+        return f"{stat.st_size:x}{int(stat.st_mtime):x}"
+    except OSError:
+        return "unknown"
+
 def load_mri_model():
-    """Load the TensorFlow MRI model using tf.saved_model.load (Safe for all versions)."""
-    global MRI_MODEL
+    """Load the MRI model with the configured runtime (SavedModel signature, or TFLite via MRI_RUNTIME)."""
+    global MRI_MODEL, MRI_MODEL_VERSION
     
     if not os.path.exists(MODEL_DIR):
         print(f"ERROR: MRI model not found at {MODEL_DIR}")
         return
 
+    import tensorflow as tf
+
     # Force CPU in production containers without GPU
     try:
         tf.config.set_visible_devices([], 'GPU')
     except Exception:
         pass
 
-    print(f"INFO: Loading MRI model from {MODEL_DIR}...")
+    print(f"INFO: Loading MRI model from {MODEL_DIR} (runtime: {MRI_RUNTIME})...")
     try:
-        # --- FIX: Using standard TF SavedModel loader instead of TFSMLayer ---
-        loaded_bundle = tf.saved_model.load(MODEL_DIR)
-        
-        # We extract the default serving signature (acts like a function)
-        MRI_MODEL = loaded_bundle.signatures['serving_default']
-        print("INFO: ✅ MRI Model loaded successfully")
+        MRI_MODEL = load_mri_runner(MODEL_DIR)
+        MRI_MODEL_VERSION = get_mri_model_version()
+        if MRI_MODEL.runtime == "tflite":
+            # Quantized outputs differ slightly, so they get their own cache keys
+            MRI_MODEL_VERSION = f"{MRI_MODEL_VERSION}-tflite-{MRI_TFLITE_QUANTIZATION}"
+        print(f"INFO: ✅ MRI Model loaded successfully ({MRI_MODEL.runtime})")
     except Exception as e:
         print(f"ERROR: Failed to load MRI model: {e}")
         MRI_MODEL = None
 
-def predict_mri_image(image_path: str):
-    """Run inference on a single MRI image."""
+def decode_mri_image(source) -> np.ndarray:
+    """Decode an MRI image (path or binary file object) into a (128, 128, 3) uint8 array."""
+    return decode_image(source, MRI_INPUT_SIZE)
+
+def preprocess_mri_image(source) -> np.ndarray:
+    """Decode an MRI image into a normalized (128, 128, 3) float32 array (single-image callers)."""
+    return MRI_BATCH_ASSEMBLER([decode_mri_image(source)])[0].copy()
+
+def predict_mri_batch(batch: np.ndarray):
+    """Run inference on a stacked (n, 128, 128, 3) batch. Returns one (label, confidence) per row."""
+    if INFERENCE_CLIENT is not None:
+        return INFERENCE_CLIENT.call("mri", batch)
+
     if MRI_MODEL is None:
         raise RuntimeError("MRI Model not loaded")
 
-    img = load_img(image_path, target_size=(128, 128))
-    img_array = img_to_array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
+    # SavedModel signature or TFLite interpreter (see mri_runtime.py); returns class probabilities
+    prediction = MRI_MODEL(batch)
+
+    class_indices = np.argmax(prediction, axis=-1)
+    results = []
+    for row, class_index in enumerate(class_indices):
+        class_index = int(class_index)
+        confidence = float(prediction[row][class_index])
+        results.append((CLASS_DICT.get(class_index, "Unknown"), confidence))
+    return results
+
+# Concurrent /api/rays/mri requests share model calls through this batcher
+# Uploads are decoded to uint8 and only become float32 inside a reused batch buffer
+MRI_BATCH_ASSEMBLER = BatchAssembler(MRI_INPUT_SIZE + (3,), MRI_BATCH_MAX_SIZE)
+
+MRI_BATCHER = MicroBatcher(
+    "mri",
+    predict_mri_batch,
+    max_batch_size=MRI_BATCH_MAX_SIZE,
+    max_wait_ms=MRI_BATCH_MAX_WAIT_MS,
+    max_inflight=MRI_BATCH_MAX_INFLIGHT,
+    executor=get_executor("mri"),
+    collate=MRI_BATCH_ASSEMBLER,
+)
 
-    # --- FIX: Convert numpy array to TF Tensor (Required for signatures) ---
-    input_tensor = tf.constant(img_array, dtype=tf.float32)
+# Repeated uploads of the same scan skip inference entirely
+MRI_CACHE = PredictionCache(
+    max_entries=MRI_CACHE_MAX_ENTRIES,
+    ttl_seconds=MRI_CACHE_TTL_SECONDS,
+    persist_dir=MRI_CACHE_DIR,
+    persist_max_entries=MRI_CACHE_DIR_MAX_ENTRIES,
+)
 
-    # Predict
-    prediction = MRI_MODEL(input_tensor)
-    
-    # Handle Dictionary output (standard for SavedModel signatures)
-    if isinstance(prediction, dict):
-        # Extract the first output tensor (usually 'dense_X' or 'output_0')
-        prediction = next(iter(prediction.values()))
+def lookup_mri_cache(fileobj):
+    """Hash an MRI upload and look it up in the prediction cache (blocking). Returns (key, cached)."""
+    key = PredictionCache.make_key(fileobj, MRI_MODEL_VERSION)
+    return key, MRI_CACHE.get(key)
+
+async def classify_mri_upload(fileobj):
+    """Cache lookup, decode and batched inference for one MRI image file. Returns (label, confidence, cached)."""
+    cache_key, cached = await run_inference("mri", lookup_mri_cache, fileobj)
+    if cached is not None:
+        return cached["label"], cached["confidence"], True
+
+    img_array = await run_inference("mri", decode_mri_image, fileobj)
+    label, confidence = await MRI_BATCHER.submit(img_array)
+    entry = {"label": label, "confidence": confidence}
+    if MRI_CACHE.persist_dir:
+        await run_inference("mri", MRI_CACHE.set, cache_key, entry)
+    else:
+        MRI_CACHE.set(cache_key, entry)
+    return label, confidence, False
+
+def summarize_mri_study(slices: List[dict]) -> dict:
+    """
+    Study-level verdict from per-slice results.
 
-    # Convert back to numpy
-    prediction = prediction.numpy()
-    
-    class_index = int(np.argmax(prediction, axis=-1)[0])
-    confidence = float(prediction[0][class_index])
-    label = CLASS_DICT.get(class_index, "Unknown")
-    return label, confidence
+    A study is reported as a tumor if any slice is; the verdict is the tumor
+    class seen on the most slices (ties go to the higher total confidence).
+    Otherwise it is 'No Tumor'. `confidence` is the mean over slices with the
+    verdict label.
+    """
+    succeeded = [item for item in slices if "prediction" in item]
+    counts: Dict[str, int] = {}
+    totals: Dict[str, float] = {}
+    for item in succeeded:
+        counts[item["prediction"]] = counts.get(item["prediction"], 0) + 1
+        totals[item["prediction"]] = totals.get(item["prediction"], 0.0) + item["confidence"]
+
+    tumor_labels = [label for label in counts if label != CLASS_DICT[2]]
+    if tumor_labels:
+        verdict = max(tumor_labels, key=lambda label: (counts[label], totals[label]))
+    elif counts:
+        verdict = CLASS_DICT[2]
+    else:
+        verdict = None
+
+    return {
+        "verdict": verdict,
+        "confidence": totals[verdict] / counts[verdict] if verdict else None,
+        "total_slices": len(slices),
+        "analyzed_slices": len(succeeded),
+        "failed_slices": len(slices) - len(succeeded),
+        "class_counts": counts,
+        "mean_confidence": {label: totals[label] / counts[label] for label in counts},
+        "tumor_slices": sorted(item["slice"] for item in succeeded if item["prediction"] != CLASS_DICT[2])
+    }
+
+def mri_result(label: str, confidence: float, cached: bool) -> dict:
+    return {
+        "prediction": label,
+        "confidence": float(confidence),
+        "confidence_percent": f"{confidence:.2%}",
+        "details": {"class": label, "score": float(confidence)},
+        "cached": cached
+    }
 
 # -------------------------
 # Helper Functions (CKD Model)
@@ -154,15 +340,218 @@ def load_ckd_models():
             return
         
         print(f"INFO: Loading CKD models from {CKD_MODEL_DIR}...")
-        CKD_SCALER = joblib.load(CKD_SCALER_PATH)
-        CKD_DIAGNOSIS_MODEL = joblib.load(CKD_DIAGNOSIS_PATH)
-        CKD_STAGE_MODEL = joblib.load(CKD_STAGE_PATH)
+        CKD_SCALER = joblib.load(CKD_SCALER_PATH, mmap_mode=MODEL_MMAP_MODE)
+        CKD_DIAGNOSIS_MODEL = joblib.load(CKD_DIAGNOSIS_PATH, mmap_mode=MODEL_MMAP_MODE)
+        CKD_STAGE_MODEL = joblib.load(CKD_STAGE_PATH, mmap_mode=MODEL_MMAP_MODE)
         CKD_MODEL_READY = True
         print("INFO: ✅ CKD Models loaded successfully")
     except Exception as e:
         print(f"ERROR: Failed to load CKD models: {e}")
         CKD_MODEL_READY = False
 
+def read_upload(upload: UploadFile):
+    """Return the upload's spooled buffer rewound to the start, without copying it to disk."""
+    upload.file.seek(0)
+    return upload.file
+
+def detach_upload(upload: UploadFile):
+    """
+    Take ownership of the upload's spooled buffer.
+
+    FastAPI closes uploads as soon as the handler returns, which is before a
+    StreamingResponse body runs. The caller must close the returned file.
+    """
+    fileobj = read_upload(upload)
+    upload.file = io.BytesIO()
+    return fileobj
+
+CKD_POSITIVE_RESULT = "Positive - Chronic Kidney Disease detected."
+CKD_NEGATIVE_RESULT = "Negative - No Chronic Kidney Disease detected."
+CKD_RESULT_FORMATS = ("json", "jsonl", "csv")
+
+def score_ckd_rows(input_df: pd.DataFrame):
+    """
+    Score every row of a CKD feature DataFrame in one vectorized pass.
+
+    Returns (diagnosis_codes, stages) as int arrays. The stage model only runs
+    on positive rows; negative rows get stage 0.
+    """
+    if INFERENCE_CLIENT is not None:
+        return INFERENCE_CLIENT.call("ckd", input_df[FEATURE_ORDER])
+
+    scaled_features = CKD_SCALER.transform(input_df[FEATURE_ORDER])
+    diagnosis_codes = np.asarray(CKD_DIAGNOSIS_MODEL.predict(scaled_features)).astype(int)
+    stages = np.zeros(len(diagnosis_codes), dtype=int)
+
+    positive = diagnosis_codes == 1
+    if positive.any():
+        stages[positive] = np.asarray(CKD_STAGE_MODEL.predict(scaled_features[positive])).astype(int)
+    return diagnosis_codes, stages
+
+def format_ckd_result(diagnosis_code: int, stage: int) -> dict:
+    if diagnosis_code == 1:
+        return {
+            "diagnosis_result": CKD_POSITIVE_RESULT,
+            "ckd_stage": f"Stage {int(stage)}",
+            "diagnosis_code": 1,
+        }
+    return {
+        "diagnosis_result": CKD_NEGATIVE_RESULT,
+        "ckd_stage": "Not applicable",
+        "diagnosis_code": int(diagnosis_code),
+    }
+
+def score_ckd(input_df: pd.DataFrame) -> dict:
+    """Run CKD diagnosis (and stage, if positive) on the first row of a feature DataFrame."""
+    diagnosis_codes, stages = score_ckd_rows(input_df.iloc[:1])
+    return format_ckd_result(diagnosis_codes[0], stages[0])
+
+def validate_ckd_columns(input_df: pd.DataFrame):
+    if len(input_df.columns) != len(FEATURE_ORDER):
+        raise ValueError(
+            f"Number of columns ({len(input_df.columns)}) != features ({len(FEATURE_ORDER)}). "
+            f"Expected: {', '.join(FEATURE_ORDER)}"
+        )
+
+def read_ckd_csv(upload: UploadFile) -> pd.DataFrame:
+    """Parse a CKD CSV upload from memory and validate its columns (blocking)."""
+    return parse_ckd_csv(read_upload(upload))
+
+def parse_ckd_csv(fileobj) -> pd.DataFrame:
+    """Parse a CKD CSV file object and validate its columns (blocking)."""
+    input_df = pd.read_csv(fileobj)
+
+    validate_ckd_columns(input_df)
+    if input_df.empty:
+        raise ValueError("CSV file contains no rows")
+    return input_df
+
+def score_next_ckd_chunk(reader):
+    """Read and score the next chunk (blocking). Returns (diagnosis_codes, stages), or None at the end."""
+    try:
+        chunk = next(reader)
+    except StopIteration:
+        return None
+    validate_ckd_columns(chunk)
+    return score_ckd_rows(chunk)
+
+class CKDChunkStream:
+    """
+    A chunked CKD CSV reader that is safe to close from the event loop.
+
+    `next_chunk` runs on the CKD pool. A `close` that lands while a chunk is
+    being read (e.g. the client disconnected) only marks the stream closed;
+    the executor thread releases the reader and file once that read is done.
+    """
+
+    def __init__(self, fileobj, chunk_rows: int):
+        self.fileobj = fileobj
+        self.chunk_rows = chunk_rows
+        self.reader = None
+        self._lock = threading.Lock()
+        self._busy = False
+        self._closed = False
+
+    def next_chunk(self):
+        """Score the next chunk (blocking). Returns (diagnosis_codes, stages), or None at the end."""
+        with self._lock:
+            if self._closed:
+                return None
+            self._busy = True
+        try:
+            if self.reader is None:
+                self.reader = pd.read_csv(self.fileobj, chunksize=self.chunk_rows)
+            return score_next_ckd_chunk(self.reader)
+        finally:
+            with self._lock:
+                self._busy = False
+                release = self._closed
+            if release:
+                self._release()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            busy = self._busy
+        if not busy:
+            self._release()
+
+    def _release(self):
+        if self.reader is not None:
+            self.reader.close()
+        self.fileobj.close()
+
+async def stream_ckd_chunks(stream: CKDChunkStream, first_chunk, fmt: str):
+    """Yield serialized results chunk by chunk, scoring the next chunk on the CKD pool."""
+    chunk = first_chunk
+    start_row = 0
+    try:
+        while chunk is not None:
+            diagnosis_codes, stages = chunk
+            yield "".join(iter_ckd_results(diagnosis_codes, stages, fmt, start_row=start_row, header=start_row == 0))
+            start_row += len(diagnosis_codes)
+            chunk = await run_inference("ckd", stream.next_chunk)
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band and stop
+        print(f"ERROR: CKD stream scoring failed at row {start_row}: {str(e)}")
+        if fmt == "jsonl":
+            yield json.dumps({"error": "Analysis failed", "message": str(e), "row": start_row}) + "\n"
+        else:
+            # A trailing comment line, so a truncated CSV never looks complete
+            message = " ".join(str(e).split())
+            yield f"# ERROR: Analysis failed at row {start_row}: {message}\n"
+    finally:
+        # Deferred to the executor thread if a chunk is still being read
+        stream.close()
+
+def score_ckd_file(upload: UploadFile):
+    """Parse and score every row of a CKD CSV upload (blocking). Returns (diagnosis_codes, stages)."""
+    return score_ckd_rows(read_ckd_csv(upload))
+
+def score_ckd_csv(fileobj):
+    """Same as score_ckd_file, for a file object the caller owns (blocking)."""
+    return score_ckd_rows(parse_ckd_csv(fileobj))
+
+def ckd_summary(diagnosis_codes, stages) -> dict:
+    """First-row result plus row totals, as stored in history for file uploads."""
+    return {
+        **format_ckd_result(diagnosis_codes[0], stages[0]),
+        "total_rows": len(diagnosis_codes),
+        "positive_rows": int(np.count_nonzero(diagnosis_codes == 1)),
+    }
+
+def ckd_rows_page(diagnosis_codes, stages, offset: int, limit: int):
+    """Clamp offset/limit and return (offset, limit, per-row results for that page)."""
+    offset = max(offset, 0)
+    limit = min(max(limit, 1), 1000)
+    page = [
+        ckd_row_result(offset + i, code, stage)
+        for i, (code, stage) in enumerate(zip(diagnosis_codes[offset:offset + limit], stages[offset:offset + limit]))
+    ]
+    return offset, limit, page
+
+def ckd_row_result(row: int, diagnosis_code: int, stage: int) -> dict:
+    result = format_ckd_result(diagnosis_code, stage)
+    return {
+        "row": row,
+        "prediction": result["diagnosis_result"],
+        "ckd_stage": result["ckd_stage"],
+        "diagnosis_code": result["diagnosis_code"],
+    }
+
+def iter_ckd_results(diagnosis_codes, stages, fmt: str, start_row: int = 0, header: bool = True):
+    """Serialize per-row CKD results lazily as JSON Lines or CSV."""
+    if fmt == "csv" and header:
+        yield "row,prediction,ckd_stage,diagnosis_code\n"
+    for offset, (code, stage) in enumerate(zip(diagnosis_codes, stages)):
+        result = ckd_row_result(start_row + offset, code, stage)
+        if fmt == "csv":
+            yield f"{result['row']},{result['prediction']},{result['ckd_stage']},{result['diagnosis_code']}\n"
+        else:
+            yield json.dumps(result) + "\n"
+
 # -------------------------
 # Helper Functions (ASCVD Risk Estimator Model)
 # -------------------------
@@ -176,15 +565,75 @@ def load_ascvd_model():
             return
         
         print(f"INFO: Loading ASCVD Risk Estimator model from {ASCVD_MODEL_PATH}...")
-        ASCVD_MODEL = joblib.load(ASCVD_MODEL_PATH)
+        ASCVD_MODEL = joblib.load(ASCVD_MODEL_PATH, mmap_mode=MODEL_MMAP_MODE)
+        configure_ascvd_features(ASCVD_MODEL)
         ASCVD_MODEL_READY = True
         print("INFO: ✅ ASCVD Risk Estimator Model loaded successfully")
     except Exception as e:
         print(f"ERROR: Failed to load ASCVD Risk Estimator model: {e}")
         ASCVD_MODEL_READY = False
 
+def configure_ascvd_features(model):
+    """
+    Match ASCVD_FEATURE_COLUMNS to the columns the model was fitted on.
+
+    The model was fitted on a DataFrame, but feature_extraction_array builds
+    plain arrays, so the column reorder (if needed) is worked out once here.
+    predict_ascvd_matrix labels the array with the fitted names, which keeps
+    sklearn from warning about missing feature names.
+    """
+    global ASCVD_FEATURE_INDEX, ASCVD_FEATURE_NAMES
+
+    fitted_names = getattr(model, "feature_names_in_", None)
+    if fitted_names is None:
+        ASCVD_FEATURE_INDEX = None
+        ASCVD_FEATURE_NAMES = None
+        return
+
+    fitted_names = list(fitted_names)
+    missing = [name for name in fitted_names if name not in ASCVD_FEATURE_COLUMNS]
+    if missing:
+        raise ValueError(f"ASCVD model expects unknown features: {', '.join(missing)}")
+
+    ASCVD_FEATURE_INDEX = None if fitted_names == ASCVD_FEATURE_COLUMNS else [
+        ASCVD_FEATURE_COLUMNS.index(name) for name in fitted_names
+    ]
+    ASCVD_FEATURE_NAMES = fitted_names
+
+def feature_extraction_array(X: np.ndarray) -> np.ndarray:
+    """
+    NumPy version of feature_extraction for an (n, 9) matrix of raw inputs in
+    ASCVD_INPUT_FIELDS order. Returns an (n, 21) float64 matrix in
+    ASCVD_FEATURE_COLUMNS order, numerically identical to the pandas version.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X[np.newaxis, :]
+    glucose, hba1c, systolic, diastolic, ldl, hdl, triglycerides, haemoglobin, mcv = X.T
+
+    features = np.empty((X.shape[0], len(ASCVD_FEATURE_COLUMNS)), dtype=np.float64)
+    features[:, :9] = X
+    # Division by zero gives inf/nan exactly like pandas, without the warnings
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features[:, 9] = glucose / hba1c
+        features[:, 10] = systolic - diastolic
+        features[:, 11] = (systolic + 2 * diastolic) / 3
+        features[:, 12] = (systolic >= 140) | (diastolic >= 90)
+        features[:, 13] = ldl + hdl + (triglycerides / 5)
+        features[:, 14] = ldl / hdl
+        features[:, 15] = triglycerides / hdl
+        features[:, 16] = features[:, 13] - hdl
+        features[:, 17] = haemoglobin < 12
+        features[:, 18] = mcv < 80
+        features[:, 19] = haemoglobin / mcv
+        features[:, 20] = (glucose / 200) + (ldl / 160) + (triglycerides / 200) + (systolic / 140)
+
+    return features
+
 def feature_extraction(df: pd.DataFrame) -> pd.DataFrame:
     """
+    Reference pandas implementation; the request path uses feature_extraction_array.
+
     Takes a DataFrame with the following columns:
     ['blood_glucose', 'hba1c', 'systolic_bp', 'diastolic_bp',
      'ldl', 'hdl', 'triglycerides', 'haemoglobin', 'mcv']
@@ -207,48 +656,192 @@ def feature_extraction(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def get_disease_recommendations(disease: str) -> dict:
-    """Get prevention and treatment recommendations for a disease."""
-    recommendations = {
-        'Anemia': {
-            'title': 'Anemia',
-            'prevention': 'Maintain a balanced diet rich in iron (red meat, spinach, lentils). Consume vitamin C to increase iron absorption. Avoid tea/coffee after meals.',
-            'treatment': 'Iron supplements under medical supervision, sometimes vitamin B12 or folic acid supplementation.',
-            'suggested_plan': 'Daily iron tablets + iron-rich diet + monitor hemoglobin levels regularly.'
-        },
-        'Hypertension': {
-            'title': 'Hypertension',
-            'prevention': 'Reduce salt intake, exercise regularly, maintain healthy weight, avoid smoking.',
-            'treatment': 'Blood pressure medication under medical supervision and regular blood pressure monitoring.',
-            'suggested_plan': 'Daily blood pressure monitoring + medications (ACE inhibitors / Beta blockers) + reduce salt intake.'
-        },
-        'Diabetes': {
-            'title': 'Diabetes',
-            'prevention': 'Healthy diet with low sugar, maintain ideal weight, exercise regularly.',
-            'treatment': 'Blood sugar lowering medications (such as Metformin) or insulin therapy.',
-            'suggested_plan': 'Balanced diet + daily exercise + medication as prescribed.'
-        },
-        'High_Cholesterol': {
-            'title': 'High Cholesterol',
-            'prevention': 'Reduce saturated fats (fried foods, butter), increase fiber (vegetables, fruits, oats), regular exercise.',
-            'treatment': 'Cholesterol-lowering medications (Statins) under medical supervision and healthy diet.',
-            'suggested_plan': 'Reduce fat intake + Statin medications + regular lipid profile monitoring.'
-        },
-        'Fit': {
-            'title': 'Healthy / Normal',
-            'prevention': 'Maintain healthy diet, exercise regularly, periodic health checkups.',
-            'treatment': 'No treatment needed, just continue healthy lifestyle.',
-            'suggested_plan': 'Annual health checkup + maintain healthy lifestyle.'
+def json_with_fragments(payload: dict, fragments: dict) -> Response:
+    """JSON response that embeds already-serialized JSON values under the given keys."""
+    body = dump_json(payload)
+    extra = ",".join(f"{dump_json(key)}:{fragment}" for key, fragment in fragments.items())
+    if extra:
+        body = f"{body[:-1]},{extra}}}" if payload else f"{{{extra}}}"
+    return Response(content=body, media_type="application/json")
+
+def predict_ascvd_matrix(X: np.ndarray) -> np.ndarray:
+    """Predict disease codes for an (n, 9) matrix of raw ASCVD inputs (blocking)."""
+    if INFERENCE_CLIENT is not None:
+        return INFERENCE_CLIENT.call("ascvd", X)
+
+    features = feature_extraction_array(X)
+    if ASCVD_FEATURE_INDEX is not None:
+        features = features[:, ASCVD_FEATURE_INDEX]
+    if ASCVD_FEATURE_NAMES is not None:
+        # Wrapping the float64 matrix does not copy it
+        features = pd.DataFrame(features, columns=ASCVD_FEATURE_NAMES, copy=False)
+    return ASCVD_MODEL.predict(features)
+
+def predict_ascvd(input_data: dict):
+    """Run feature extraction and the ASCVD model on one patient (blocking)."""
+    row = np.array([[input_data[field] for field in ASCVD_INPUT_FIELDS]], dtype=np.float64)
+    return predict_ascvd_matrix(row)[0]
+
+def read_ascvd_csv(upload: UploadFile) -> np.ndarray:
+    """Parse an ASCVD CSV upload (one patient per row) into an (n, 9) input matrix (blocking)."""
+    df = pd.read_csv(read_upload(upload))
+    df.columns = df.columns.str.lower()
+    expected = [field.lower() for field in ASCVD_INPUT_FIELDS]
+    missing = [column for column in expected if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}. Expected: {', '.join(ASCVD_INPUT_FIELDS)}")
+    return df[expected].to_numpy(dtype=np.float64)
+
+def ascvd_batch_response(predictions: np.ndarray) -> Response:
+    """Per-patient results plus one shared recommendation per predicted disease."""
+    results = []
+    diseases = []
+    for index, code in enumerate(predictions):
+        disease = RECOMMENDATIONS.disease_for(code)
+        results.append({"index": index, "disease": disease, "disease_code": int(code)})
+        if disease not in diseases:
+            diseases.append(disease)
+
+    recommendations = ",".join(f"{dump_json(disease)}:{RECOMMENDATIONS.fragment(disease)}" for disease in diseases)
+    return json_with_fragments(
+        {
+            "status": "success",
+            "count": len(results),
+            "results": results,
+            "recommendations_version": RECOMMENDATIONS.version
         },
-        'Unknown': {
-            'title': 'Unknown',
-            'prevention': 'Unable to provide recommendations due to insufficient data.',
-            'treatment': 'Please consult a medical professional.',
-            'suggested_plan': 'Please consult a medical professional.'
-        }
+        {"recommendations": f"{{{recommendations}}}"}
+    )
+
+# -------------------------
+# Helper Functions (News)
+# -------------------------
+class NewsAPIError(Exception):
+    """NewsAPI answered, but with a non-ok status."""
+
+async def fetch_news(category: str, lang: str, page: int) -> dict:
+    """Fetch and format one page of headlines from NewsAPI. Raises on any failure."""
+    params = {
+        "category": category,
+        "language": lang,
+        "page": page,
+        "pageSize": 20,
+        "apiKey": GNEWS_API_KEY,
     }
-    
-    return recommendations.get(disease, recommendations['Unknown'])
+    response = await get_with_retries("news", NEWS_API_URL, params=params)
+    response.raise_for_status()
+    try:
+        data = response.json()
+    except ValueError:
+        print(f"ERROR: NewsAPI returned a non-JSON body (content-type: {response.headers.get('content-type')})")
+        raise NewsAPIError("Invalid response from news provider")
+    if not isinstance(data, dict):
+        raise NewsAPIError("Invalid response from news provider")
+
+    if data.get("status") != "ok":
+        print(f"ERROR: NewsAPI returned status '{data.get('status')}' - Message: {data.get('message')}")
+        raise NewsAPIError(data.get('message'))
+
+    formatted_articles = []
+    for article in data.get("articles", []):
+        if article.get("title") == "[Removed]" or not article.get("url"):
+            continue
+
+        formatted_articles.append({
+            "id": article.get("url"),
+            "title": article.get("title", "No Title Available"),
+            "description": article.get("description", article.get("content", "No description available.")),
+            "url": article.get("url"),
+            "image": article.get("urlToImage"),
+            "publishedAt": article.get("publishedAt"),
+            "source": {
+                "name": article.get("source", {}).get("name", "Unknown Source")
+            }
+        })
+
+    total_results = data.get("totalResults", 100)
+    total_pages = min(int(total_results / 20) + 1, 5)
+
+    return {
+        "status": "success",
+        "category": category,
+        "language": lang,
+        "page": page,
+        "total_pages": total_pages,
+        "articles": formatted_articles
+    }
+
+# Identical (category, lang, page) requests share one cached upstream call
+NEWS_CACHE = StaleWhileRevalidateCache(
+    fetch_news,
+    ttl_seconds=NEWS_CACHE_TTL_SECONDS,
+    stale_seconds=NEWS_CACHE_STALE_SECONDS,
+    max_entries=NEWS_CACHE_MAX_ENTRIES,
+)
+
+# -------------------------
+# Helper Functions (Streaming)
+# -------------------------
+def sse_event(event: str, data: dict) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# -------------------------
+# Helper Functions (History)
+# -------------------------
+async def record_analysis(user: Optional[CurrentUser], analysis_type: str, diagnosis: str,
+                          confidence: Optional[float] = None, result: Optional[dict] = None):
+    """Queue an AnalysisHistory row for a signed-in user; written in batches by HISTORY_WRITER."""
+    if user is None:
+        return
+    await HISTORY_WRITER.record(
+        user_id=user.id,
+        analysis_type=analysis_type,
+        diagnosis=diagnosis,
+        confidence_score=f"{confidence:.4f}" if confidence is not None else None,
+        analysis_result=json.dumps(result) if result is not None else None
+    )
+
+# -------------------------
+# Model Loading
+# -------------------------
+def connect_remote_model(name: str):
+    """Wait for an inference worker to finish loading a model (INFERENCE_BACKEND=remote)."""
+    global MRI_MODEL_VERSION
+    status = INFERENCE_CLIENT.wait_ready(name, timeout=INFERENCE_WORKER_READY_TIMEOUT_SECONDS)
+    if name == "mri" and status.get("mri_model_version"):
+        MRI_MODEL_VERSION = status["mri_model_version"]
+
+if INFERENCE_CLIENT is not None:
+    for model_name in ("mri", "ckd", "ascvd"):
+        MODEL_LOADER.register(
+            model_name,
+            lambda name=model_name: connect_remote_model(name),
+            lambda name=model_name: INFERENCE_CLIENT.is_ready(name)
+        )
+else:
+    MODEL_LOADER.register("mri", load_mri_model, lambda: MRI_MODEL is not None)
+    MODEL_LOADER.register("ckd", load_ckd_models, lambda: CKD_MODEL_READY)
+    MODEL_LOADER.register("ascvd", load_ascvd_model, lambda: ASCVD_MODEL_READY)
+
+async def require_model(name: str, message: str):
+    """Wait for (or lazily start) a model's load. Returns a 503 response if it is unusable, else None."""
+    if await MODEL_LOADER.ensure_loaded(name):
+        return None
+    return JSONResponse(
+        status_code=503,
+        content={"error": message, "model_state": MODEL_LOADER.state(name)},
+        headers={"Retry-After": "5"}
+    )
+
+def inference_unavailable(e: Exception) -> JSONResponse:
+    """503 for requests whose inference worker could not be reached or died mid-request."""
+    print(f"ERROR: Inference worker unavailable: {str(e)}")
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Inference service unavailable", "message": str(e)},
+        headers={"Retry-After": "5"}
+    )
 
 # -------------------------
 # Startup Event
@@ -257,21 +850,34 @@ def get_disease_recommendations(disease: str) -> dict:
 def startup_event():
     print("INFO: Starting HealthAI Backend...")
     
-    # Initialize database
-    print("INFO: Initializing database...")
-    try:
-        check_db_connection()
-        init_db()
-    except Exception as e:
-        print(f"WARNING: Database initialization failed: {e}")
+    # Initialize database (gunicorn prefork does this once in the master, see gunicorn.conf.py)
+    if os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true":
+        print("INFO: Initializing database...")
+        try:
+            check_db_connection()
+            init_db()
+        except Exception as e:
+            print(f"WARNING: Database initialization failed: {e}")
     
-    # Load ML models
-    load_mri_model()
-    load_ckd_models()
-    load_ascvd_model()
+    # Load ML models concurrently; in background/lazy mode this returns immediately
+    print(f"INFO: Loading models (mode: {MODEL_LOADER.mode})...")
+    MODEL_LOADER.start(wait=MODEL_LOADER.mode == "eager")
     
     print("INFO: ✅ HealthAI Backend started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    MODEL_LOADER.shutdown()
+    if INFERENCE_CLIENT is not None:
+        INFERENCE_CLIENT.close()
+    await MRI_BATCHER.close()
+    shutdown_executors()
+    await close_http_clients()
+    shutdown_password_pool()
+    await JOB_MANAGER.close()
+    await HISTORY_WRITER.close()
+    await close_async_engine()
+
 # -------------------------
 # Root Endpoints
 # -------------------------
@@ -297,15 +903,67 @@ def get_rays():
         "title": "Medical Imaging Analysis",
         "description": "Upload your MRI scans for AI-powered analysis",
         "supported_formats": ["jpg", "jpeg", "png"],
-        "model_ready": MRI_MODEL is not None
+        "model_ready": MODEL_LOADER.is_ready("mri"),
+        "model_state": MODEL_LOADER.state("mri")
+    }
+
+@router.get("/metrics")
+def get_metrics():
+    return {
+        "status": "success",
+        "mri_batcher": MRI_BATCHER.stats(),
+        "mri_preprocessing": MRI_BATCH_ASSEMBLER.stats(),
+        "mri_cache": MRI_CACHE.stats(),
+        "news_cache": NEWS_CACHE.stats(),
+        "inference_executors": executor_stats(),
+        "password_hashing": password_pool_stats(),
+        "token_cache": token_cache_stats(),
+        "history_writer": HISTORY_WRITER.stats(),
+        "model_loading": MODEL_LOADER.stats(),
+        "jobs": JOB_MANAGER.stats(),
+        "admission": admission_stats(),
+        "inference_backend": INFERENCE_CLIENT.stats() if INFERENCE_CLIENT is not None else {"backend": "local"}
+    }
+
+def summary_to_dict(summary) -> dict:
+    recent = json.loads(summary.recent)
+    return {
+        "analysis_type": summary.analysis_type,
+        "total_count": summary.total_count,
+        "diagnosis_counts": json.loads(summary.diagnosis_counts),
+        "last_diagnosis": recent[0]["diagnosis"] if recent else None,
+        "last_confidence": recent[0]["confidence"] if recent else None,
+        "last_analysis_at": summary.last_analysis_at.isoformat() if summary.last_analysis_at else None,
+        # Oldest to newest, for charting
+        "confidence_trend": [item["confidence"] for item in reversed(recent) if item["confidence"] is not None]
     }
 
+async def load_user_summaries(user: Optional[CurrentUser], db: AsyncSession):
+    """A signed-in user's AnalysisSummary rows (empty for anonymous callers)."""
+    if user is None:
+        return []
+    try:
+        return await get_user_analysis_summaries_async(db, user.id)
+    except Exception as e:
+        print(f"ERROR: Failed to load analysis summaries: {e}")
+        return []
+
 @router.get("/report")
-def get_report():
+async def get_report(
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    summaries = await load_user_summaries(user, db)
+    if not summaries:
+        return {
+            "status": "success",
+            "reports": [],
+            "message": "No reports available yet"
+        }
     return {
         "status": "success",
-        "reports": [],
-        "message": "No reports available yet"
+        "reports": [summary_to_dict(summary) for summary in summaries],
+        "total_analyses": sum(summary.total_count for summary in summaries)
     }
 
 @router.get("/about")
@@ -319,7 +977,21 @@ def get_about():
     }
 
 @router.get("/analysis")
-def get_analysis():
+async def get_analysis(
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    summaries = await load_user_summaries(user, db)
+    recent_analyses = sorted(
+        (
+            {"analysis_type": summary.analysis_type, **item}
+            for summary in summaries
+            for item in json.loads(summary.recent)
+        ),
+        key=lambda item: item["created_at"],
+        reverse=True
+    )[:10]
+
     return {
         "status": "success",
         "message": "Analysis Dashboard",
@@ -329,21 +1001,24 @@ def get_analysis():
                 "name": "Brain MRI Analysis",
                 "description": "Advanced AI analysis of brain MRI scans for tumor detection and classification",
                 "type": "image",
-                "ready": MRI_MODEL is not None
+                "ready": MODEL_LOADER.is_ready("mri"),
+                "state": MODEL_LOADER.state("mri")
             },
             {
                 "id": "ckd-analysis",
                 "name": "Chronic Kidney Disease Analysis",
                 "description": "Comprehensive CKD analysis from laboratory data",
                 "type": "data",
-                "ready": CKD_MODEL_READY
+                "ready": MODEL_LOADER.is_ready("ckd"),
+                "state": MODEL_LOADER.state("ckd")
             },
             {
                 "id": "ascvd-risk",
                 "name": "ASCVD Risk Assessment",
                 "description": "Predict cardiovascular disease risk based on blood test markers (glucose, cholesterol, blood pressure, etc.)",
                 "type": "data",
-                "ready": ASCVD_MODEL_READY
+                "ready": MODEL_LOADER.is_ready("ascvd"),
+                "state": MODEL_LOADER.state("ascvd")
             },
             {
                 "id": "chest-xray",
@@ -354,7 +1029,7 @@ def get_analysis():
                 "coming_soon": True
             }
         ],
-        "recent_analyses": []
+        "recent_analyses": recent_analyses
     }
 
 @router.get("/askdoctor")
@@ -375,7 +1050,7 @@ def get_contact():
     }
 
 @router.get("/news")
-def get_news(category: str = "health", lang: str = "en", page: int = 1):
+async def get_news(category: str = "health", lang: str = "en", page: int = 1):
     
     if not GNEWS_API_KEY:
         print("CRITICAL: GNEWS_API_KEY environment variable is NOT set. Returning mock data.")
@@ -398,48 +1073,13 @@ def get_news(category: str = "health", lang: str = "en", page: int = 1):
              ]
          }
 
-    # NewsAPI Endpoint
-    url = f"https://newsapi.org/v2/top-headlines?category={category}&language={lang}&page={page}&pageSize=20&apiKey={GNEWS_API_KEY}"
-    
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get("status") != "ok":
-            print(f"ERROR: NewsAPI returned status '{data.get('status')}' - Message: {data.get('message')}")
-            return {"status": "error", "articles": [], "message": data.get('message')}
-
-        formatted_articles = []
-        for article in data.get("articles", []):
-            if article.get("title") == "[Removed]" or not article.get("url"):
-                continue
-
-            formatted_articles.append({
-                "id": article.get("url"),
-                "title": article.get("title", "No Title Available"),
-                "description": article.get("description", article.get("content", "No description available.")),
-                "url": article.get("url"),
-                "image": article.get("urlToImage"),
-                "publishedAt": article.get("publishedAt"),
-                "source": {
-                    "name": article.get("source", {}).get("name", "Unknown Source")
-                }
-            })
-
-        total_results = data.get("totalResults", 100)
-        total_pages = min(int(total_results / 20) + 1, 5)
+        return await NEWS_CACHE.get((category, lang, page))
 
-        return {
-            "status": "success",
-            "category": category,
-            "language": lang,
-            "page": page,
-            "total_pages": total_pages,
-            "articles": formatted_articles
-        }
+    except NewsAPIError as e:
+        return {"status": "error", "articles": [], "message": str(e)}
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"ERROR: Failed to connect to NewsAPI: {e}")
         return {
             "status": "error",
@@ -448,92 +1088,253 @@ def get_news(category: str = "health", lang: str = "en", page: int = 1):
         }
 
 # -------------------------
-# MRI Analysis Endpoint
+# History Endpoints
 # -------------------------
-@router.post("/rays/mri")
-async def analyze_mri(file: UploadFile = File(...)):
-    if MRI_MODEL is None:
-        return JSONResponse(status_code=503, content={"error": "MRI Model not ready"})
+def history_record_to_dict(record) -> dict:
+    try:
+        result = json.loads(record.analysis_result) if record.analysis_result else None
+    except ValueError:
+        result = record.analysis_result
+    return {
+        "id": record.id,
+        "analysis_type": record.analysis_type,
+        "diagnosis": record.diagnosis,
+        "confidence_score": record.confidence_score,
+        "result": result,
+        "created_at": record.created_at.isoformat()
+    }
 
-    temp_filename = os.path.join(UPLOAD_DIR, f"{int(time.time())}_{file.filename}")
+@router.get("/history")
+async def get_history(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    analysis_type: Optional[str] = None,
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    The signed-in user's analyses, newest first.
 
+    Pass the returned `next_cursor` back as `cursor` to get the next page;
+    it is null on the last page. `analysis_type` filters to one kind
+    (e.g. `mri`, `ckd`, `ascvd`).
+    """
+    limit = min(max(limit, 1), 100)
     try:
-        with open(temp_filename, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        records, next_cursor = await get_user_analysis_history_page_async(
+            db, user.id, limit=limit, cursor=cursor, analysis_type=analysis_type
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": "Invalid cursor", "message": str(e)})
+
+    return {
+        "status": "success",
+        "items": [history_record_to_dict(record) for record in records],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
 
-        label, confidence = predict_mri_image(temp_filename)
+# -------------------------
+# MRI Analysis Endpoint
+# -------------------------
+@router.post("/rays/mri")
+async def analyze_mri(file: UploadFile = File(...), user: Optional[CurrentUser] = Depends(get_optional_user)):
+    unavailable = await require_model("mri", "MRI Model not ready")
+    if unavailable:
+        return unavailable
+
+    try:
+        label, confidence, cached = await classify_mri_upload(read_upload(file))
+        await record_analysis(user, "mri", label, confidence, {"class": label, "score": float(confidence)})
         
-        return {
-            "status": "success",
-            "prediction": label,
-            "confidence": float(confidence),
-            "confidence_percent": f"{confidence:.2%}",
-            "details": {"class": label, "score": float(confidence)}
-        }
+        return {"status": "success", **mri_result(label, confidence, cached)}
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
     except Exception as e:
         print(f"ERROR: MRI analysis failed: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"error": "Analysis failed", "message": str(e)}
         )
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+
+# Slice tasks outlive a study stream whose client disconnects; hold references until they finish
+MRI_STUDY_TASKS = set()
+
+@router.post("/rays/mri/study")
+async def analyze_mri_study(
+    files: List[UploadFile] = File(...),
+    user: Optional[CurrentUser] = Depends(get_optional_user)
+):
+    """
+    Classify every slice of an MRI study and stream the results as Server-Sent Events.
+
+    All slices go to the MRI batcher at once, so they share batched model
+    calls. Events: `start` (slice count), one `slice` per image in completion
+    order (`slice` is its upload index), then a final `study` with the
+    aggregate verdict. A slice that fails gets a `slice` event with `error`.
+    """
+    unavailable = await require_model("mri", "MRI Model not ready")
+    if unavailable:
+        return unavailable
+
+    if not files or len(files) > MRI_STUDY_MAX_SLICES:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid study", "message": f"Study must contain 1 to {MRI_STUDY_MAX_SLICES} images"}
+        )
+
+    uploads = [(index, file.filename, detach_upload(file)) for index, file in enumerate(files)]
+    # Enough slices in flight to fill the next batch while one runs
+    slots = asyncio.Semaphore(2 * MRI_BATCH_MAX_SIZE)
+    stopping = asyncio.Event()
+
+    async def classify_slice(index: int, filename: Optional[str], fileobj) -> Optional[dict]:
+        # Never cancelled, so the file is only closed once no executor thread can still be reading it
+        try:
+            async with slots:
+                if stopping.is_set():
+                    return None
+                label, confidence, cached = await classify_mri_upload(fileobj)
+                return {"slice": index, "filename": filename, **mri_result(label, confidence, cached)}
+        except Exception as e:
+            print(f"ERROR: MRI study slice {index} failed: {str(e)}")
+            return {"slice": index, "filename": filename, "error": str(e)}
+        finally:
+            fileobj.close()
+
+    async def events():
+        tasks = []
+        for upload in uploads:
+            task = asyncio.ensure_future(classify_slice(*upload))
+            MRI_STUDY_TASKS.add(task)
+            task.add_done_callback(MRI_STUDY_TASKS.discard)
+            tasks.append(task)
+        try:
+            yield sse_event("start", {"total_slices": len(tasks)})
+            slices = []
+            for next_slice in asyncio.as_completed(tasks):
+                result = await next_slice
+                slices.append(result)
+                yield sse_event("slice", result)
+
+            study = summarize_mri_study(slices)
+            if study["verdict"] is not None:
+                await record_analysis(user, "mri_study", study["verdict"], study["confidence"], study)
+            yield sse_event("study", study)
+        finally:
+            # Client went away mid-study: slices not started yet are skipped, running ones finish
+            stopping.set()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # -------------------------
 # CKD Analysis Endpoints
 # -------------------------
 @router.post("/analysis/ckd/file")
-async def analyze_ckd_file(file: UploadFile = File(...)):
-    if not CKD_MODEL_READY:
-        return JSONResponse(status_code=503, content={"error": "CKD Models not ready"})
+async def analyze_ckd_file(
+    file: UploadFile = File(...),
+    format: str = "json",
+    offset: int = 0,
+    limit: int = 100,
+    user: Optional[CurrentUser] = Depends(get_optional_user)
+):
+    """
+    Score every patient row in a CKD CSV upload.
+
+    `format=json` returns one page of per-row results (`offset`/`limit`);
+    `format=jsonl` or `format=csv` streams all rows. The top-level
+    prediction fields describe the first row, as before.
+    """
+    unavailable = await require_model("ckd", "CKD Models not ready")
+    if unavailable:
+        return unavailable
 
-    temp_filename = os.path.join(UPLOAD_DIR, f"ckd_input_{int(time.time())}_{file.filename}")
+    if format not in CKD_RESULT_FORMATS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid format", "message": f"Expected one of: {', '.join(CKD_RESULT_FORMATS)}"}
+        )
 
     try:
-        with open(temp_filename, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        diagnosis_codes, stages = await run_inference("ckd", score_ckd_file, file)
+        summary = ckd_summary(diagnosis_codes, stages)
+        await record_analysis(user, "ckd", summary["diagnosis_result"], result=summary)
 
-        input_df = pd.read_csv(temp_filename)
-        
-        if len(input_df.columns) != len(FEATURE_ORDER):
-            raise ValueError(
-                f"Number of columns ({len(input_df.columns)}) != features ({len(FEATURE_ORDER)}). "
-                f"Expected: {', '.join(FEATURE_ORDER)}"
-            )
+        if format != "json":
+            media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+            return StreamingResponse(iter_ckd_results(diagnosis_codes, stages, format), media_type=media_type)
 
-        input_df = input_df[FEATURE_ORDER]
-        scaled_features = CKD_SCALER.transform(input_df)
-        diagnosis_prediction = CKD_DIAGNOSIS_MODEL.predict(scaled_features)[0]
-
-        if diagnosis_prediction == 1:
-            stage_prediction = CKD_STAGE_MODEL.predict(scaled_features)[0]
-            result = {
-                "diagnosis_result": "Positive - Chronic Kidney Disease detected.",
-                "ckd_stage": f"Stage {int(stage_prediction)}",
-            }
-        else:
-            result = {
-                "diagnosis_result": "Negative - No Chronic Kidney Disease detected.",
-                "ckd_stage": "Not applicable",
-            }
+        offset, limit, page = ckd_rows_page(diagnosis_codes, stages, offset, limit)
 
         return {
             "status": "success",
-            "prediction": result["diagnosis_result"],
-            "ckd_stage": result["ckd_stage"],
-            "diagnosis_code": int(diagnosis_prediction)
+            "prediction": summary["diagnosis_result"],
+            "ckd_stage": summary["ckd_stage"],
+            "diagnosis_code": summary["diagnosis_code"],
+            "total_rows": summary["total_rows"],
+            "positive_rows": summary["positive_rows"],
+            "offset": offset,
+            "limit": limit,
+            "results": page
         }
 
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
     except Exception as e:
         print(f"ERROR: CKD analysis failed: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"error": "Analysis failed", "message": str(e)}
         )
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+
+@router.post("/analysis/ckd/file/stream")
+async def analyze_ckd_file_stream(
+    file: UploadFile = File(...),
+    format: str = "jsonl",
+    chunk_rows: int = Query(CKD_STREAM_CHUNK_ROWS, ge=1, le=CKD_STREAM_MAX_CHUNK_ROWS)
+):
+    """
+    Score a very large CKD CSV upload chunk by chunk.
+
+    The file is read `chunk_rows` rows at a time and each chunk's results are
+    streamed out as JSON Lines or CSV before the next one is read, so memory
+    stays flat regardless of file size; `chunk_rows` above
+    CKD_STREAM_MAX_CHUNK_ROWS is rejected with 422. If a later chunk fails, the output
+    ends with an error line: a JSON object for jsonl, a `# ERROR:` comment for csv.
+    """
+    unavailable = await require_model("ckd", "CKD Models not ready")
+    if unavailable:
+        return unavailable
+
+    if format not in ("jsonl", "csv"):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid format", "message": "Expected one of: jsonl, csv"}
+        )
+
+    stream = CKDChunkStream(detach_upload(file), chunk_rows)
+    try:
+        # Score the first chunk up front so bad input still gets a normal error response
+        first_chunk = await run_inference("ckd", stream.next_chunk)
+        if first_chunk is None:
+            raise ValueError("CSV file contains no rows")
+    except InferenceWorkerUnavailable as e:
+        stream.close()
+        return inference_unavailable(e)
+    except Exception as e:
+        stream.close()
+        print(f"ERROR: CKD stream analysis failed: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Analysis failed", "message": str(e)}
+        )
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_ckd_chunks(stream, first_chunk, format), media_type=media_type)
 
 @router.post("/analysis/ckd/manual")
 async def analyze_ckd_manual(
@@ -544,10 +1345,12 @@ async def analyze_ckd_manual(
     serum_calcium: float,
     bun: float,
     urine_ph: float,
-    oxalate_levels: float
+    oxalate_levels: float,
+    user: Optional[CurrentUser] = Depends(get_optional_user)
 ):
-    if not CKD_MODEL_READY:
-        return JSONResponse(status_code=503, content={"error": "CKD Models not ready"})
+    unavailable = await require_model("ckd", "CKD Models not ready")
+    if unavailable:
+        return unavailable
 
     try:
         input_data = {
@@ -562,30 +1365,19 @@ async def analyze_ckd_manual(
         }
 
         input_df = pd.DataFrame(input_data)
-        input_df = input_df[FEATURE_ORDER]
-        scaled_features = CKD_SCALER.transform(input_df)
-        diagnosis_prediction = CKD_DIAGNOSIS_MODEL.predict(scaled_features)[0]
-
-        if diagnosis_prediction == 1:
-            stage_prediction = CKD_STAGE_MODEL.predict(scaled_features)[0]
-            result = {
-                "diagnosis_result": "Positive - Chronic Kidney Disease detected.",
-                "ckd_stage": f"Stage {int(stage_prediction)}",
-            }
-        else:
-            result = {
-                "diagnosis_result": "Negative - No Chronic Kidney Disease detected.",
-                "ckd_stage": "Not applicable",
-            }
+        result = await run_inference("ckd", score_ckd, input_df)
+        await record_analysis(user, "ckd", result["diagnosis_result"], result=result)
 
         return {
             "status": "success",
             "prediction": result["diagnosis_result"],
             "ckd_stage": result["ckd_stage"],
-            "diagnosis_code": int(diagnosis_prediction),
+            "diagnosis_code": result["diagnosis_code"],
             "input_data": input_data
         }
 
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
     except Exception as e:
         print(f"ERROR: CKD manual analysis failed: {str(e)}")
         return JSONResponse(
@@ -597,12 +1389,13 @@ async def analyze_ckd_manual(
 # ASCVD Risk Assessment Endpoint
 # -------------------------
 @router.post("/analysis/ascvd-risk")
-async def analyze_ascvd_risk(data: ASCVDRiskInput):
+async def analyze_ascvd_risk(data: ASCVDRiskInput, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """
     Predict cardiovascular disease risk based on health markers from blood tests.
     """
-    if not ASCVD_MODEL_READY:
-        return JSONResponse(status_code=503, content={"error": "ASCVD Risk Estimator Model not ready"})
+    unavailable = await require_model("ascvd", "ASCVD Risk Estimator Model not ready")
+    if unavailable:
+        return unavailable
 
     try:
         # Convert input to dictionary
@@ -618,37 +1411,29 @@ async def analyze_ascvd_risk(data: ASCVDRiskInput):
             'MCV': data.MCV
         }
 
-        # Create DataFrame
-        df = pd.DataFrame([input_data])
-
-        # Apply feature extraction
-        processed_df = feature_extraction(df.copy())
-
-        # Make prediction
-        prediction = ASCVD_MODEL.predict(processed_df)[0]
-        
-        # Disease mapping
-        disease_map = {
-            0: 'Anemia',
-            1: 'Fit',
-            2: 'Hypertension',
-            3: 'Diabetes',
-            4: 'High_Cholesterol'
-        }
+        # Feature extraction + prediction run on the ASCVD inference pool
+        prediction = await run_inference("ascvd", predict_ascvd, input_data)
         
-        predicted_disease = disease_map.get(prediction, 'Unknown')
-        
-        # Get recommendations
-        recommendation = get_disease_recommendations(predicted_disease)
+        predicted_disease = RECOMMENDATIONS.disease_for(prediction)
+        await record_analysis(
+            user, "ascvd", predicted_disease,
+            result={"disease_code": int(prediction), "input_data": input_data}
+        )
         
-        return {
-            "status": "success",
-            "disease": predicted_disease,
-            "disease_code": int(prediction),
-            "recommendation": recommendation,
-            "input_data": input_data
-        }
+        # Recommendations are static, so embed the pre-serialized fragment
+        return json_with_fragments(
+            {
+                "status": "success",
+                "disease": predicted_disease,
+                "disease_code": int(prediction),
+                "input_data": input_data,
+                "recommendations_version": RECOMMENDATIONS.version
+            },
+            {"recommendation": RECOMMENDATIONS.fragment(predicted_disease)}
+        )
 
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
     except Exception as e:
         print(f"ERROR: ASCVD Risk assessment failed: {str(e)}")
         return JSONResponse(
@@ -656,6 +1441,239 @@ async def analyze_ascvd_risk(data: ASCVDRiskInput):
             content={"error": "Analysis failed", "message": str(e)}
         )
 
+@router.post("/analysis/ascvd-risk/batch")
+async def analyze_ascvd_risk_batch(data: List[ASCVDRiskInput]):
+    """
+    Predict cardiovascular disease risk for many patients in one model call.
+    """
+    unavailable = await require_model("ascvd", "ASCVD Risk Estimator Model not ready")
+    if unavailable:
+        return unavailable
+
+    if not data or len(data) > ASCVD_BATCH_MAX_ROWS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Invalid batch", "message": f"Batch must contain 1 to {ASCVD_BATCH_MAX_ROWS} patients"}
+        )
+
+    try:
+        X = np.array([[getattr(item, field) for field in ASCVD_INPUT_FIELDS] for item in data], dtype=np.float64)
+        predictions = await run_inference("ascvd", predict_ascvd_matrix, X)
+        return ascvd_batch_response(predictions)
+
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
+    except Exception as e:
+        print(f"ERROR: ASCVD batch assessment failed: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Analysis failed", "message": str(e)}
+        )
+
+@router.post("/analysis/ascvd-risk/batch/file")
+async def analyze_ascvd_risk_file(file: UploadFile = File(...)):
+    """
+    Predict cardiovascular disease risk for every row of an uploaded CSV
+    with columns: blood_glucose, HbA1C, Systolic_BP, Diastolic_BP, LDL, HDL,
+    Triglycerides, Haemoglobin, MCV (case-insensitive).
+    """
+    unavailable = await require_model("ascvd", "ASCVD Risk Estimator Model not ready")
+    if unavailable:
+        return unavailable
+
+    try:
+        X = await run_inference("ascvd", read_ascvd_csv, file)
+        if len(X) == 0 or len(X) > ASCVD_BATCH_MAX_ROWS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Invalid batch", "message": f"CSV must contain 1 to {ASCVD_BATCH_MAX_ROWS} rows"}
+            )
+
+        predictions = await run_inference("ascvd", predict_ascvd_matrix, X)
+        return ascvd_batch_response(predictions)
+
+    except InferenceWorkerUnavailable as e:
+        return inference_unavailable(e)
+    except Exception as e:
+        print(f"ERROR: ASCVD batch file assessment failed: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Analysis failed", "message": str(e)}
+        )
+
+# -------------------------
+# Job Endpoints
+# -------------------------
+JOB_POLL_MAX_WAIT_SECONDS = 30.0
+JOB_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+def job_accepted(job, request: Request) -> JSONResponse:
+    """202 with the new job and where to poll it."""
+    status_url = str(request.url_for("get_job", job_id=job.id))
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "accepted",
+            **job.to_dict(),
+            "status_url": status_url,
+            "events_url": f"{status_url}/events"
+        },
+        headers={"Location": status_url}
+    )
+
+def jobs_full(e: JobQueueFull) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Job queue full", "message": str(e)},
+        headers={"Retry-After": "5"}
+    )
+
+def job_to_dict(job, offset: int = 0, limit: int = 100) -> dict:
+    """Job status; finished CKD jobs include one page (`offset`/`limit`) of per-row results."""
+    payload = job.to_dict()
+    if job.kind == "ckd" and job.state == "succeeded":
+        summary, diagnosis_codes, stages = job.result
+        offset, limit, page = ckd_rows_page(diagnosis_codes, stages, offset, limit)
+        payload["result"] = {
+            "prediction": summary["diagnosis_result"],
+            "ckd_stage": summary["ckd_stage"],
+            "diagnosis_code": summary["diagnosis_code"],
+            "total_rows": summary["total_rows"],
+            "positive_rows": summary["positive_rows"],
+            "offset": offset,
+            "limit": limit,
+            "results": page
+        }
+    return payload
+
+async def find_job(job_id: str, user: Optional[CurrentUser]):
+    """A job the caller may see: anonymous jobs by id, signed-in users' jobs only by their owner."""
+    job = await JOB_MANAGER.find(job_id)
+    if job is None or (job.user_id is not None and (user is None or user.id != job.user_id)):
+        return None
+    return job
+
+def job_not_found() -> JSONResponse:
+    return JSONResponse(
+        status_code=404,
+        content={"error": "Job not found", "message": "Unknown or expired job id"}
+    )
+
+@router.post("/jobs/mri")
+async def submit_mri_job(
+    request: Request,
+    file: UploadFile = File(...),
+    user: Optional[CurrentUser] = Depends(get_optional_user)
+):
+    """
+    Queue an MRI analysis and return at once with a job id.
+
+    Poll `GET /api/jobs/{job_id}` or subscribe to `/api/jobs/{job_id}/events`
+    for the result, which has the same fields as `/api/rays/mri`.
+    """
+    unavailable = await require_model("mri", "MRI Model not ready")
+    if unavailable:
+        return unavailable
+
+    fileobj = detach_upload(file)
+
+    async def run():
+        try:
+            label, confidence, cached = await classify_mri_upload(fileobj)
+        finally:
+            fileobj.close()
+        await record_analysis(user, "mri", label, confidence, {"class": label, "score": float(confidence)})
+        return mri_result(label, confidence, cached)
+
+    try:
+        job = await JOB_MANAGER.submit("mri", run, user_id=user.id if user else None)
+    except JobQueueFull as e:
+        fileobj.close()
+        return jobs_full(e)
+    return job_accepted(job, request)
+
+@router.post("/jobs/ckd")
+async def submit_ckd_job(
+    request: Request,
+    file: UploadFile = File(...),
+    user: Optional[CurrentUser] = Depends(get_optional_user)
+):
+    """
+    Queue scoring of a CKD CSV upload and return at once with a job id.
+
+    The finished job's result matches `/api/analysis/ckd/file`; page through
+    rows with `offset`/`limit` on `GET /api/jobs/{job_id}`.
+    """
+    unavailable = await require_model("ckd", "CKD Models not ready")
+    if unavailable:
+        return unavailable
+
+    fileobj = detach_upload(file)
+
+    async def run():
+        try:
+            diagnosis_codes, stages = await run_inference("ckd", score_ckd_csv, fileobj)
+        finally:
+            fileobj.close()
+        summary = ckd_summary(diagnosis_codes, stages)
+        await record_analysis(user, "ckd", summary["diagnosis_result"], result=summary)
+        return summary, diagnosis_codes, stages
+
+    try:
+        job = await JOB_MANAGER.submit("ckd", run, user_id=user.id if user else None)
+    except JobQueueFull as e:
+        fileobj.close()
+        return jobs_full(e)
+    return job_accepted(job, request)
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = 0,
+    offset: int = 0,
+    limit: int = 100,
+    user: Optional[CurrentUser] = Depends(get_optional_user)
+):
+    """
+    A job's state and, once it has finished, its result or error.
+
+    `wait` (seconds, up to 30) long-polls: the response is held until the
+    job finishes or the time runs out.
+    """
+    job = await find_job(job_id, user)
+    if job is None:
+        return job_not_found()
+
+    if wait > 0 and not job.done:
+        job = await JOB_MANAGER.wait(job, min(wait, JOB_POLL_MAX_WAIT_SECONDS))
+    return {"status": "success", **job_to_dict(job, offset, limit)}
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, user: Optional[CurrentUser] = Depends(get_optional_user)):
+    """
+    Server-Sent Events for one job: a `status` event if it is still pending, comment keep-alives
+    while it runs, then a single `result` event and the stream closes.
+    """
+    job = await find_job(job_id, user)
+    if job is None:
+        return job_not_found()
+
+    async def events():
+        current = job
+        if not current.done:
+            yield sse_event("status", current.to_dict())
+        while not current.done:
+            current = await JOB_MANAGER.wait(current, JOB_EVENTS_KEEPALIVE_SECONDS)
+            if not current.done:
+                yield ": keep-alive\n\n"
+        yield sse_event("result", job_to_dict(current))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 app.include_router(router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
 
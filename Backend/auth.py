@@ -2,31 +2,39 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
+from sqlalchemy import event
 import os
-import requests
+import threading
+import time
 
 from db import (
-    get_db, get_user_by_email, get_user_by_google_id, 
-    create_user, update_user_last_login, get_user_by_id
+    User, get_async_db, get_user_by_email_async, get_user_by_google_id_async,
+    create_user_async, update_user_last_login_async, get_user_by_id_async
 )
+from cache import TTLCache
+from config import settings
+from http_client import get_with_retries
+from passwords import hash_password_async, verify_password_async, PasswordPoolSaturated
 
 # -------------------------
 # Configuration
 # -------------------------
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production-use-openssl-rand-hex-32")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
+SECRET_KEY = settings.JWT_SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Validated token -> user snapshot cache for get_current_user
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 # Router
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -52,6 +60,20 @@ class Token(BaseModel):
     token_type: str
     user: dict
 
+class CurrentUser(BaseModel):
+    """Detached snapshot of the authenticated user, safe to cache across requests."""
+    id: int
+    email: str
+    full_name: Optional[str] = None
+    profile_picture: Optional[str] = None
+    is_active: Optional[bool] = None
+    is_verified: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class UserResponse(BaseModel):
     id: int
     email: str
@@ -67,11 +89,12 @@ class UserResponse(BaseModel):
 # Helpers
 # -------------------------
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -79,7 +102,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# -------------------------
+# Token Cache
+# -------------------------
+# Revocation is durable through users.token_version: tokens carry the version
+# they were issued with and are rejected on a cache miss once it changes.
+# Entries also carry the user's in-process generation, bumped on any ORM
+# update/delete of that user, so this worker drops them at once. Other gunicorn
+# workers keep serving their cached copy for up to TOKEN_CACHE_TTL_SECONDS;
+# that is the revocation window, so keep the TTL short.
+TOKEN_CACHE = TTLCache(max_entries=TOKEN_CACHE_MAX_ENTRIES, ttl_seconds=TOKEN_CACHE_TTL_SECONDS)
+_user_generations: Dict[int, int] = {}
+_generations_lock = threading.Lock()
+
+def invalidate_user(user_id: int):
+    """Drop cached tokens for a user (called when the user is updated or deactivated)."""
+    with _generations_lock:
+        _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target):
+    invalidate_user(target.id)
+
+def token_cache_stats() -> dict:
+    return TOKEN_CACHE.stats()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    cached = TOKEN_CACHE.get(token)
+    if cached is not None:
+        user, generation, expires_at = cached
+        if time.time() < expires_at and generation == _user_generations.get(user.id, 0):
+            return user
+        TOKEN_CACHE.pop(token)
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials"
@@ -92,30 +148,49 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_id(db, int(user_id))
-    if not user:
+    generation = _user_generations.get(int(user_id), 0)
+    user = await get_user_by_id_async(db, int(user_id))
+    if not user or int(payload.get("ver", 0)) != user.token_version:
         raise credentials_exception
-    return user
+
+    snapshot = CurrentUser.model_validate(user)
+    TOKEN_CACHE.set(token, (snapshot, generation, float(payload.get("exp", time.time()))))
+    return snapshot
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme),
+                            db: AsyncSession = Depends(get_async_db)) -> Optional[CurrentUser]:
+    """Like get_current_user, but anonymous or invalid tokens give None instead of 401."""
+    if not token:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
 
 # -------------------------
 # Routes
 # -------------------------
 
 @auth_router.post("/signup", response_model=Token, status_code=status.HTTP_201_CREATED)
-def signup(user_data: UserSignup, db: Session = Depends(get_db)):
-    user = get_user_by_email(db, user_data.email)
+async def signup(user_data: UserSignup, db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_email_async(db, user_data.email)
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user_data.password)
-    user = create_user(
+    # bcrypt runs on its own bounded pool, not the shared threadpool
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except PasswordPoolSaturated:
+        raise password_pool_busy()
+
+    user = await create_user_async(
         db=db,
         email=user_data.email,
         hashed_password=hashed_password,
         full_name=user_data.full_name
     )
 
-    access_token = create_access_token({"sub": str(user.id)})
+    access_token = create_access_token({"sub": str(user.id), "ver": user.token_version})
 
     return {
         "access_token": access_token,
@@ -130,17 +205,67 @@ def signup(user_data: UserSignup, db: Session = Depends(get_db)):
     }
 
 @auth_router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = get_user_by_email(db, user_data.email)
-    if not user or not user.hashed_password or not verify_password(user_data.password, user.hashed_password):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await get_user_by_email_async(db, user_data.email)
+    try:
+        password_ok = bool(user and user.hashed_password) and await verify_password_async(
+            user_data.password, user.hashed_password
+        )
+    except PasswordPoolSaturated:
+        raise password_pool_busy()
+
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
 
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Account deactivated")
 
-    update_user_last_login(db, user.id)
+    await update_user_last_login_async(db, user.id)
 
-    access_token = create_access_token({"sub": str(user.id)})
+    access_token = create_access_token({"sub": str(user.id), "ver": user.token_version})
+
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "full_name": user.full_name,
+            "profile_picture": user.profile_picture,
+            "is_verified": user.is_verified
+        }
+    }
+
+async def login_google_user(db: AsyncSession, google_user_info: dict) -> dict:
+    """Find or create the user for verified Google profile info and issue a token."""
+    google_id = google_user_info["sub"]
+    email = google_user_info["email"]
+    full_name = google_user_info.get("name")
+    profile_picture = google_user_info.get("picture")
+
+    user = await get_user_by_google_id_async(db, google_id)
+
+    if not user:
+        user = await get_user_by_email_async(db, email)
+        if user:
+            user.google_id = google_id
+            user.oauth_provider = "google"
+            user.profile_picture = profile_picture
+            user.is_verified = True
+            await db.commit()
+        else:
+            user = await create_user_async(
+                db=db,
+                email=email,
+                full_name=full_name,
+                google_id=google_id,
+                oauth_provider="google",
+                profile_picture=profile_picture
+            )
+
+    await update_user_last_login_async(db, user.id)
+
+    access_token = create_access_token({"sub": str(user.id), "ver": user.token_version})
 
     return {
         "access_token": access_token,
@@ -155,61 +280,24 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 @auth_router.post("/google", response_model=Token)
-def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db)):
+async def google_auth(auth_data: GoogleAuthRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Accepts Google ACCESS TOKEN from frontend
     """
 
     try:
-        # ✅ Get user info directly from Google
-        google_user_info = requests.get(
-            "https://www.googleapis.com/oauth2/v3/userinfo",
+        # ✅ Get user info directly from Google (pooled client, with timeout and retries)
+        response = await get_with_retries(
+            "google",
+            GOOGLE_USERINFO_URL,
             headers={"Authorization": f"Bearer {auth_data.credential}"}
-        ).json()
+        )
+        google_user_info = response.json()
 
         if "sub" not in google_user_info:
             raise HTTPException(status_code=401, detail="Invalid Google token")
 
-        google_id = google_user_info["sub"]
-        email = google_user_info["email"]
-        full_name = google_user_info.get("name")
-        profile_picture = google_user_info.get("picture")
-
-        user = get_user_by_google_id(db, google_id)
-
-        if not user:
-            user = get_user_by_email(db, email)
-            if user:
-                user.google_id = google_id
-                user.oauth_provider = "google"
-                user.profile_picture = profile_picture
-                user.is_verified = True
-                db.commit()
-            else:
-                user = create_user(
-                    db=db,
-                    email=email,
-                    full_name=full_name,
-                    google_id=google_id,
-                    oauth_provider="google",
-                    profile_picture=profile_picture
-                )
-
-        update_user_last_login(db, user.id)
-
-        access_token = create_access_token({"sub": str(user.id)})
-
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "full_name": user.full_name,
-                "profile_picture": user.profile_picture,
-                "is_verified": user.is_verified
-            }
-        }
+        return await login_google_user(db, google_user_info)
 
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,154 @@
+# batching.py - Dynamic micro-batching for model inference
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Groups concurrent inference requests into one batched model call.
+
+    Each caller submits a single preprocessed sample. The batcher waits until
+    `max_batch_size` samples are queued or the first one has waited
+    `max_wait_ms`, stacks them into one array and calls `predict_batch` once.
+    `predict_batch` must return one result per row, in order; every caller
+    gets back its own row. A custom `collate(samples) -> array` can replace
+    the default np.stack; it runs on the executor, right before the model call.
+
+    At most `max_inflight` batches run at the same time. While they are busy,
+    new requests keep queueing, so the next batch fills up under load.
+    """
+
+    def __init__(self, name: str, predict_batch: Callable[[np.ndarray], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 10.0,
+                 max_inflight: int = 1, executor=None,
+                 collate: Optional[Callable[[List[np.ndarray]], np.ndarray]] = None):
+        self.name = name
+        self.predict_batch = predict_batch
+        self.collate = collate or np.stack
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_inflight = max(1, int(max_inflight))
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.last_batch_size = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+        self._total_wait_ms = 0.0
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            self._worker = asyncio.get_running_loop().create_task(self._collect())
+
+    async def submit(self, sample: np.ndarray):
+        """Queue one sample and wait for its prediction."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sample, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            samples = [sample for sample, _, _ in batch]
+            results = await loop.run_in_executor(self.executor, self._run_batch, samples)
+        except Exception as e:
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        self._record(batch, started, latency_ms)
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _run_batch(self, samples: List[np.ndarray]):
+        return self.predict_batch(self.collate(samples))
+
+    def _record(self, batch, started: float, latency_ms: float):
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        self.last_batch_size = size
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+        self._total_wait_ms += sum((started - queued_at) * 1000.0 for _, _, queued_at in batch)
+
+    def stats(self) -> dict:
+        """Per-batch size and latency stats for tuning."""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_inflight": self.max_inflight,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "last_batch_size": self.last_batch_size,
+            "avg_latency_ms": self._total_latency_ms / self.batches if self.batches else 0.0,
+            "last_latency_ms": self.last_latency_ms,
+            "max_latency_ms": self.max_latency_ms,
+            "avg_queue_wait_ms": self._total_wait_ms / self.items if self.items else 0.0,
+        }
+
+    async def close(self):
+        """Stop collecting new batches and let running ones finish."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
@@ -0,0 +1,305 @@
+# cache.py - In-process caches for predictions and other hot-path lookups
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+
+    Holds at most `max_entries` items; the least recently used one is evicted
+    first. Entries older than `ttl_seconds` are treated as missing.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if time.time() - stored_at < self.ttl_seconds:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, stored_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, stored_at if stored_at is not None else time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class PredictionCache(TTLCache):
+    """
+    Content-addressed cache of model predictions.
+
+    Keys are the SHA-256 of the uploaded bytes plus the model version, so a new
+    model never serves results from an old one. If `persist_dir` is set, every
+    entry is also written there as a small JSON file and memory misses fall
+    back to it, so hits survive restarts.
+
+    The disk tier holds at most `persist_max_entries` files. Once more have
+    been written, the oldest are deleted down to 90% of the limit (so the
+    directory scan is rare); expired files are deleted when read.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0,
+                 persist_dir: Optional[str] = None, persist_max_entries: int = 10000):
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.persist_dir = persist_dir or None
+        self.persist_max_entries = max(1, int(persist_max_entries))
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._disk_entries = 0
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            self._disk_entries = len(self._disk_files())
+
+    @staticmethod
+    def make_key(fileobj, model_version: str, chunk_size: int = 1024 * 1024) -> str:
+        """Hash a binary file object (rewound before and after) together with the model version."""
+        digest = hashlib.sha256()
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+            digest.update(chunk)
+        fileobj.seek(0)
+        return f"{model_version}-{digest.hexdigest()}"
+
+    def _path(self, key: str) -> str:
+        # Keys embed the model version string, so hash them into a safe file name
+        return os.path.join(self.persist_dir, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+    def _disk_files(self):
+        """(mtime, path) of every persisted entry, oldest first."""
+        files = []
+        with os.scandir(self.persist_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+        files.sort()
+        return files
+
+    def _remove_file(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _trim_disk(self):
+        """Delete the oldest files once the disk tier is over persist_max_entries."""
+        try:
+            files = self._disk_files()
+        except OSError as e:
+            print(f"WARNING: Failed to scan cache directory {self.persist_dir}: {e}")
+            return
+        excess = len(files) - int(self.persist_max_entries * 0.9)
+        removed = 0
+        if len(files) > self.persist_max_entries:
+            for _, path in files[:excess]:
+                removed += self._remove_file(path)
+        with self._lock:
+            self.disk_evictions += removed
+            self._disk_entries = len(files) - removed
+
+    def get(self, key, default=None):
+        value = super().get(key)
+        if value is not None or not self.persist_dir:
+            return default if value is None else value
+
+        try:
+            with open(self._path(key), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+
+        if time.time() - entry["stored_at"] >= self.ttl_seconds:
+            if self._remove_file(self._path(key)):
+                with self._lock:
+                    self._disk_entries -= 1
+            return default
+        value = entry["value"]
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+            self.disk_hits += 1
+        super().set(key, value, stored_at=entry["stored_at"])
+        return value
+
+    def set(self, key, value, stored_at: Optional[float] = None):
+        stored_at = stored_at if stored_at is not None else time.time()
+        super().set(key, value, stored_at=stored_at)
+        if not self.persist_dir:
+            return
+
+        # Write-then-rename so readers never see a partial file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"value": value, "stored_at": stored_at}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: Failed to persist cache entry {key}: {e}")
+            return
+
+        # Overwrites also count, which only makes the next trim come a little early
+        with self._lock:
+            self._disk_entries += 1
+            over_budget = self._disk_entries > self.persist_max_entries
+        if over_budget:
+            self._trim_disk()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["persist_dir"] = self.persist_dir
+        if self.persist_dir:
+            stats["disk_entries"] = self._disk_entries
+            stats["disk_max_entries"] = self.persist_max_entries
+            stats["disk_evictions"] = self.disk_evictions
+        return stats
+
+
+class StaleWhileRevalidateCache:
+    """
+    Async cache for slow upstream calls, with stale-while-revalidate.
+
+    `fetch(*key)` is awaited to load a value. For `ttl_seconds` an entry is
+    served as fresh. For another `stale_seconds` it is still served, while a
+    single background refresh replaces it. Concurrent misses for the same key
+    share one fetch. If a fetch fails, the last good value is returned even
+    when it is past the stale window, so outages degrade to old data instead
+    of errors. Failed fetches are never cached.
+    """
+
+    def __init__(self, fetch, ttl_seconds: float = 300.0, stale_seconds: float = 3600.0,
+                 max_entries: int = 256):
+        self.fetch = fetch
+        self.ttl_seconds = float(ttl_seconds)
+        self.stale_seconds = float(stale_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._inflight = {}
+
+        # Stats
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.fallbacks = 0
+
+    async def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            self._entries.move_to_end(key)
+            if age < self.ttl_seconds:
+                self.hits += 1
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                self.stale_hits += 1
+                self._start_fetch(key)
+                return value
+
+        self.misses += 1
+        try:
+            return await asyncio.shield(self._start_fetch(key))
+        except Exception:
+            if entry is None:
+                raise
+            # Upstream is failing; an old answer beats an error
+            self.fallbacks += 1
+            return entry[0]
+
+    def _start_fetch(self, key: tuple) -> "asyncio.Task":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch_and_store(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task
+
+    def _fetch_done(self, key: tuple, task: "asyncio.Task"):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.fetch_errors += 1
+            print(f"WARNING: Cache refresh failed for {key}: {task.exception()}")
+
+    async def _fetch_and_store(self, key: tuple):
+        self.fetches += 1
+        value = await self.fetch(*key)
+        self._entries[key] = (value, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "fallbacks": self.fallbacks,
+            "refreshing": len(self._inflight),
+        }
@@ -0,0 +1,173 @@
+# convert_mri_model.py - Convert the MRI SavedModel to TFLite and check it against the original
+#
+#   python convert_mri_model.py --quantization dynamic --eval-dir /data/mri-holdout
+#   python convert_mri_model.py --quantization int8 --calibration-dir /data/mri-train \
+#       --eval-dir /data/mri-holdout --output /app/models/mri_int8.tflite
+#
+# Writes the .tflite file that MRI_RUNTIME=tflite loads (point MRI_TFLITE_PATH
+# at it; the image does not ship one). int8 is calibrated on --calibration-dir,
+# which must not share images with --eval-dir. Then reports, on the held-out
+# images:
+#   - top-1 agreement and max probability drift vs. the SavedModel signature
+#   - accuracy of both, if images are in per-class folders (glioma/, no tumor/, ...)
+#   - per-batch latency and peak RSS of each runtime, each measured in a fresh process
+# Exits non-zero if agreement is below --min-agreement.
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mri_runtime import (
+    MRI_TFLITE_THREADS, TFLITE_QUANTIZATIONS, SavedModelRunner, TFLiteRunner, convert_saved_model
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def iter_eval_images(eval_dir: str):
+    """Yield (path, label) for every image under eval_dir; label is the class folder name or None."""
+    from app import CLASS_DICT
+
+    labels = {name.lower(): name for name in CLASS_DICT.values()}
+    for root, _, files in os.walk(eval_dir):
+        label = labels.get(os.path.basename(root).lower().replace("_", " "))
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name), label
+
+
+def load_images(paths) -> np.ndarray:
+    from app import preprocess_mri_image
+
+    return np.stack([preprocess_mri_image(path) for path in paths]).astype(np.float32)
+
+
+def predict_all(runner, images: np.ndarray, batch_size: int) -> np.ndarray:
+    return np.concatenate([runner(images[i:i + batch_size]) for i in range(0, len(images), batch_size)])
+
+
+def benchmark(runtime: str, model_dir: str, tflite_path: str, images: np.ndarray,
+              batch_size: int, repeats: int) -> dict:
+    """Load one runtime and time it (run in its own process so RSS numbers are not mixed)."""
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if runtime == "tflite":
+        runner = TFLiteRunner(tflite_path, num_threads=MRI_TFLITE_THREADS)
+    else:
+        runner = SavedModelRunner(model_dir)
+    load_ms = (time.perf_counter() - started) * 1000.0
+
+    batch = images[:batch_size]
+    runner(batch)  # warm up
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        runner(batch)
+        timings.append((time.perf_counter() - started) * 1000.0)
+
+    return {
+        "runtime": runtime,
+        "batch_size": len(batch),
+        "load_ms": round(load_ms, 1),
+        "latency_ms_mean": round(float(np.mean(timings)), 2),
+        "latency_ms_p95": round(float(np.percentile(timings, 95)), 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "model_rss_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024.0, 1),
+    }
+
+
+def main() -> int:
+    from app import CLASS_DICT, MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Convert the MRI SavedModel to TFLite and check parity, latency and RSS.")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--quantization", default="dynamic", choices=TFLITE_QUANTIZATIONS)
+    parser.add_argument("--output", help="defaults to mri_<quantization>.tflite next to this script")
+    parser.add_argument("--eval-dir", required=True, help="held-out MRI images (optionally in per-class folders)")
+    parser.add_argument("--calibration-dir", help="images used to calibrate int8 (required for int8, disjoint from --eval-dir)")
+    parser.add_argument("--calibration-count", type=int, default=200, help="images used to calibrate int8")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), f"mri_{args.quantization}.tflite")
+
+    samples = list(iter_eval_images(args.eval_dir))
+    if not samples:
+        print(f"ERROR: No images found under {args.eval_dir}")
+        return 2
+    paths, labels = zip(*samples)
+
+    calibration = None
+    if args.quantization == "int8":
+        if not args.calibration_dir:
+            print("ERROR: --calibration-dir is required for int8 (calibrating on --eval-dir would bias the parity report)")
+            return 2
+        calibration_paths = [path for path, _ in iter_eval_images(args.calibration_dir)][:args.calibration_count]
+        if not calibration_paths:
+            print(f"ERROR: No images found under {args.calibration_dir}")
+            return 2
+        overlap = {os.path.realpath(path) for path in calibration_paths} & {os.path.realpath(path) for path in paths}
+        if overlap:
+            print(f"ERROR: {len(overlap)} calibration images are also in --eval-dir; use a disjoint split")
+            return 2
+        calibration_images = load_images(calibration_paths)
+        calibration = (calibration_images[i:i + 1] for i in range(len(calibration_images)))
+        print(f"INFO: Loaded {len(calibration_images)} calibration images")
+
+    images = load_images(paths)
+    print(f"INFO: Loaded {len(images)} held-out images")
+
+    print(f"INFO: Converting {args.model_dir} with {args.quantization} quantization...")
+    with open(output, "wb") as f:
+        f.write(convert_saved_model(args.model_dir, args.quantization, calibration))
+    print(f"INFO: Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    # Parity on the full held-out set
+    reference = predict_all(SavedModelRunner(args.model_dir), images, args.batch_size)
+    candidate = predict_all(TFLiteRunner(output, num_threads=MRI_TFLITE_THREADS), images, args.batch_size)
+    reference_top1 = reference.argmax(axis=-1)
+    candidate_top1 = candidate.argmax(axis=-1)
+    agreement = float(np.mean(reference_top1 == candidate_top1))
+    report = {
+        "quantization": args.quantization,
+        "tflite_path": output,
+        "tflite_mb": round(os.path.getsize(output) / 1e6, 2),
+        "images": len(images),
+        "top1_agreement": round(agreement, 4),
+        "max_abs_prob_diff": round(float(np.max(np.abs(reference - candidate))), 5),
+    }
+
+    labelled = [i for i, label in enumerate(labels) if label is not None]
+    if labelled:
+        truth = np.array([labels[i] for i in labelled])
+        names = np.array([CLASS_DICT[int(c)] for c in range(len(CLASS_DICT))])
+        report["accuracy_savedmodel"] = round(float(np.mean(names[reference_top1[labelled]] == truth)), 4)
+        report["accuracy_tflite"] = round(float(np.mean(names[candidate_top1[labelled]] == truth)), 4)
+
+    # Latency / RSS, one fresh process per runtime
+    spawn = multiprocessing.get_context("spawn")
+    report["benchmarks"] = []
+    for runtime in ("savedmodel", "tflite"):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            report["benchmarks"].append(pool.submit(
+                benchmark, runtime, args.model_dir, output, images, args.batch_size, args.repeats
+            ).result())
+
+    print(json.dumps(report, indent=2))
+    if agreement < args.min_agreement:
+        print(f"ERROR: Top-1 agreement {agreement:.4f} is below {args.min_agreement}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
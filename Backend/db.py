@@ -1,19 +1,65 @@
 # db.py - Database configuration and models for HealthAI
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, event, inspect, Column, Integer, String, DateTime, Boolean, Text, Index, select, update, delete, text, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from importlib import import_module
+import base64
+import json
 import os
 
-# Database URL from environment variable
-DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://healthai:yourpassword@db:5432/healthai_db")
+from config import settings
+
+# Database URL (DATABASE_URL in the environment or .env, see config.Settings)
+DATABASE_URL = settings.DATABASE_URL
+
+# Connection pool settings (shared by the sync and async engines)
+DB_POOL_SIZE = settings.DB_POOL_SIZE
+DB_MAX_OVERFLOW = settings.DB_MAX_OVERFLOW
+DB_POOL_RECYCLE = settings.DB_POOL_RECYCLE
+DB_POOL_TIMEOUT = settings.DB_POOL_TIMEOUT
+
+# Recent results kept per user and analysis type in AnalysisSummary
+ANALYSIS_SUMMARY_RECENT = int(os.getenv("ANALYSIS_SUMMARY_RECENT", "10"))
+
+
+def to_async_database_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    async_driver = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}.get(dialect)
+    return f"{dialect}+{async_driver}{sep}{rest}" if async_driver else url
+
+
+# Async driver URL (asyncpg by default), derived from DATABASE_URL unless set explicitly
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or to_async_database_url(DATABASE_URL)
+
+
+def pool_options(url: str) -> dict:
+    """QueuePool sizing for server databases; SQLite (local dev) keeps its default pool."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_pre_ping": True,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
 
 # Create engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session factory for request handlers.
+# expire_on_commit=False keeps loaded attributes usable after commit (no lazy IO).
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -39,6 +85,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     verification_token = Column(String(255), nullable=True)
+    # Embedded in issued JWTs; bumping it revokes every token issued before
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -49,6 +97,16 @@ class User(Base):
         return f"<User(id={self.id}, email={self.email}, full_name={self.full_name})>"
 
 
+# Changes to these columns revoke the user's outstanding tokens
+TOKEN_REVOKING_COLUMNS = ("email", "hashed_password", "is_active")
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TOKEN_REVOKING_COLUMNS):
+        target.token_version = (target.token_version or 0) + 1
+
+
 class AnalysisHistory(Base):
     """
     Analysis history for users - will store references to MinIO objects
@@ -57,7 +115,7 @@ class AnalysisHistory(Base):
     __tablename__ = "analysis_history"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True, nullable=False)  # Foreign key to users.id
+    user_id = Column(Integer, nullable=False)  # Foreign key to users.id (indexed via the composite indexes below)
     
     # Analysis details
     analysis_type = Column(String(50), nullable=False)  # 'mri', 'ckd', 'xray', etc.
@@ -73,11 +131,59 @@ class AnalysisHistory(Base):
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Keyset pagination: newest first per user, optionally per analysis type
+    __table_args__ = (
+        Index("ix_analysis_history_user_created_id", user_id, created_at.desc(), id.desc()),
+        Index("ix_analysis_history_user_type_created_id", user_id, analysis_type, created_at.desc(), id.desc()),
+    )
     
     def __repr__(self):
         return f"<AnalysisHistory(id={self.id}, user_id={self.user_id}, type={self.analysis_type})>"
 
 
+class AnalysisSummary(Base):
+    """
+    Per-user, per-analysis-type aggregates over AnalysisHistory.
+    Updated in the same transaction as each history write, so dashboards read
+    a handful of rows instead of scanning the user's whole history.
+    """
+    __tablename__ = "analysis_summaries"
+
+    user_id = Column(Integer, primary_key=True)
+    analysis_type = Column(String(50), primary_key=True)
+
+    total_count = Column(Integer, default=0, nullable=False)
+    diagnosis_counts = Column(Text, default="{}", nullable=False)  # JSON {diagnosis: count}
+    recent = Column(Text, default="[]", nullable=False)  # JSON, newest first: [{diagnosis, confidence, created_at}]
+    last_analysis_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AnalysisSummary(user_id={self.user_id}, type={self.analysis_type}, count={self.total_count})>"
+
+
+class AnalysisJob(Base):
+    """
+    State and result of a background job (see jobs.py).
+    Shared by all server processes, so any worker can answer a poll.
+    """
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    user_id = Column(Integer, index=True, nullable=True)
+    state = Column(String(20), nullable=False)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<AnalysisJob(id={self.id}, kind={self.kind}, state={self.state})>"
+
+
 class UserSession(Base):
     """
     User sessions for tracking active logins (optional, for security)
@@ -120,16 +226,70 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency function to get an async database session
+    Usage in FastAPI:
+        @app.get("/some-endpoint")
+        async def endpoint(db: AsyncSession = Depends(get_async_db)):
+            user = await get_user_by_email_async(db, email)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def close_async_engine():
+    """Release pooled async connections (call on shutdown)"""
+    await async_engine.dispose()
+
+
 def init_db():
     """
     Initialize database - create all tables
     Call this on application startup
     """
     print("INFO: Creating database tables...")
+    summaries_exist = inspect(engine).has_table(AnalysisSummary.__tablename__)
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist
+    for index in AnalysisHistory.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    add_missing_user_columns()
+    if not summaries_exist:
+        backfill_analysis_summaries()
     print("INFO: ✅ Database tables created successfully")
 
 
+def add_missing_user_columns():
+    """Add users columns introduced after the table was created (create_all never alters tables)"""
+    existing = {column["name"] for column in inspect(engine).get_columns(User.__tablename__)}
+    if "token_version" not in existing:
+        print("INFO: Adding users.token_version column...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def backfill_analysis_summaries():
+    """Build AnalysisSummary rows from existing history (one pass, run when the table is first created)"""
+    db = SessionLocal()
+    try:
+        summaries = {}
+        records = db.query(AnalysisHistory)\
+            .order_by(AnalysisHistory.created_at, AnalysisHistory.id)\
+            .yield_per(1000)
+        for record in records:
+            key = (record.user_id, record.analysis_type)
+            if key not in summaries:
+                summaries[key] = AnalysisSummary(user_id=record.user_id, analysis_type=record.analysis_type)
+            merge_analysis_summary(summaries[key], [history_row(record)])
+        db.add_all(summaries.values())
+        db.commit()
+        if summaries:
+            print(f"INFO: Backfilled {len(summaries)} analysis summaries")
+    finally:
+        db.close()
+
+
 def check_db_connection():
     """
     Check if database connection is working
@@ -137,7 +297,7 @@ def check_db_connection():
     """
     try:
         db = SessionLocal()
-        db.execute("SELECT 1")
+        db.execute(text("SELECT 1"))
         db.close()
         print("INFO: ✅ Database connection successful")
         return True
@@ -214,6 +374,226 @@ def get_user_analysis_history(db, user_id: int, limit: int = 10):
     """Get user's analysis history"""
     return db.query(AnalysisHistory)\
         .filter(AnalysisHistory.user_id == user_id)\
-        .order_by(AnalysisHistory.created_at.desc())\
+        .order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc())\
         .limit(limit)\
         .all()
+
+
+# -------------------------
+# Async CRUD Operations
+# -------------------------
+
+async def get_user_by_email_async(db, email: str):
+    """Get user by email"""
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
+
+
+async def get_user_by_google_id_async(db, google_id: str):
+    """Get user by Google ID"""
+    result = await db.execute(select(User).where(User.google_id == google_id).limit(1))
+    return result.scalars().first()
+
+
+async def get_user_by_id_async(db, user_id: int):
+    """Get user by ID"""
+    return await db.get(User, user_id)
+
+
+async def create_user_async(db, email: str, hashed_password: str = None, full_name: str = None,
+                            google_id: str = None, oauth_provider: str = None, profile_picture: str = None):
+    """Create a new user"""
+    user = User(
+        email=email,
+        hashed_password=hashed_password,
+        full_name=full_name,
+        google_id=google_id,
+        oauth_provider=oauth_provider,
+        profile_picture=profile_picture,
+        is_verified=bool(google_id)  # Auto-verify OAuth users
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def update_user_last_login_async(db, user_id: int):
+    """Update user's last login timestamp (single UPDATE, no prior SELECT)"""
+    await db.execute(
+        update(User).where(User.id == user_id).values(last_login=datetime.utcnow())
+    )
+    await db.commit()
+
+
+async def create_analysis_record_async(db, user_id: int, analysis_type: str, analysis_result: str,
+                                       confidence_score: str = None, diagnosis: str = None,
+                                       minio_image_path: str = None, minio_report_path: str = None):
+    """Create a new analysis history record"""
+    record = AnalysisHistory(
+        user_id=user_id,
+        analysis_type=analysis_type,
+        analysis_result=analysis_result,
+        confidence_score=confidence_score,
+        diagnosis=diagnosis,
+        minio_image_path=minio_image_path,
+        minio_report_path=minio_report_path
+    )
+    db.add(record)
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+
+async def get_user_analysis_history_async(db, user_id: int, limit: int = 10):
+    """Get user's analysis history"""
+    result = await db.execute(
+        select(AnalysisHistory)
+        .where(AnalysisHistory.user_id == user_id)
+        .order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+def encode_history_cursor(record) -> str:
+    """Opaque cursor pointing just after `record` in newest-first order."""
+    raw = json.dumps([record.created_at.isoformat(), record.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str):
+    """Return (created_at, id) from a cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid history cursor") from e
+
+
+async def get_user_analysis_history_page_async(db, user_id: int, limit: int = 20,
+                                               cursor: str = None, analysis_type: str = None):
+    """
+    One page of a user's analysis history, newest first.
+
+    Uses keyset pagination on (created_at, id), so every page is an index range
+    scan of `limit` rows however deep it is. Returns (records, next_cursor);
+    next_cursor is None on the last page.
+    """
+    query = select(AnalysisHistory).where(AnalysisHistory.user_id == user_id)
+    if analysis_type:
+        query = query.where(AnalysisHistory.analysis_type == analysis_type)
+    if cursor:
+        created_at, record_id = decode_history_cursor(cursor)
+        query = query.where(tuple_(AnalysisHistory.created_at, AnalysisHistory.id) < tuple_(created_at, record_id))
+
+    result = await db.execute(
+        query.order_by(AnalysisHistory.created_at.desc(), AnalysisHistory.id.desc()).limit(limit + 1)
+    )
+    records = result.scalars().all()
+    next_cursor = encode_history_cursor(records[limit - 1]) if len(records) > limit else None
+    return records[:limit], next_cursor
+
+
+# -------------------------
+# Analysis Summaries
+# -------------------------
+
+def history_row(record) -> dict:
+    """The AnalysisHistory fields that summaries are built from"""
+    return {
+        "user_id": record.user_id,
+        "analysis_type": record.analysis_type,
+        "diagnosis": record.diagnosis,
+        "confidence_score": record.confidence_score,
+        "created_at": record.created_at,
+    }
+
+
+def merge_analysis_summary(summary, rows):
+    """Fold new history rows (dicts with history_row's keys) into a summary"""
+    counts = json.loads(summary.diagnosis_counts or "{}")
+    recent = json.loads(summary.recent or "[]")
+    for row in rows:
+        diagnosis = row["diagnosis"] or "Unknown"
+        counts[diagnosis] = counts.get(diagnosis, 0) + 1
+        recent.append({
+            "diagnosis": row["diagnosis"],
+            "confidence": float(row["confidence_score"]) if row["confidence_score"] else None,
+            "created_at": row["created_at"].isoformat(),
+        })
+        if summary.last_analysis_at is None or row["created_at"] > summary.last_analysis_at:
+            summary.last_analysis_at = row["created_at"]
+
+    # Batches from several workers can interleave, so re-sort before trimming
+    recent.sort(key=lambda item: item["created_at"], reverse=True)
+    summary.total_count = (summary.total_count or 0) + len(rows)
+    summary.diagnosis_counts = json.dumps(counts)
+    summary.recent = json.dumps(recent[:ANALYSIS_SUMMARY_RECENT])
+
+
+async def update_analysis_summaries_async(db, rows):
+    """
+    Apply a batch of new history rows to their AnalysisSummary rows.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    grouped = {}
+    for row in rows:
+        grouped.setdefault((row["user_id"], row["analysis_type"]), []).append(row)
+    # Every writer seeds and locks keys in the same order, so workers flushing
+    # overlapping batches at once queue behind each other instead of deadlocking
+    keys = sorted(grouped)
+
+    # Seed missing rows first so concurrent writers (other workers) lock the same row
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = import_module(f"sqlalchemy.dialects.{dialect}").insert
+        await db.execute(
+            dialect_insert(AnalysisSummary)
+            .values([{"user_id": user_id, "analysis_type": analysis_type} for user_id, analysis_type in keys])
+            .on_conflict_do_nothing()
+        )
+
+    result = await db.execute(
+        select(AnalysisSummary)
+        .where(tuple_(AnalysisSummary.user_id, AnalysisSummary.analysis_type).in_(keys))
+        .order_by(AnalysisSummary.user_id, AnalysisSummary.analysis_type)
+        .with_for_update()
+    )
+    summaries = {(summary.user_id, summary.analysis_type): summary for summary in result.scalars()}
+
+    for key, key_rows in grouped.items():
+        summary = summaries.get(key)
+        if summary is None:
+            summary = AnalysisSummary(user_id=key[0], analysis_type=key[1])
+            db.add(summary)
+        merge_analysis_summary(summary, key_rows)
+
+
+async def get_user_analysis_summaries_async(db, user_id: int):
+    """Get a user's per-analysis-type summaries"""
+    result = await db.execute(
+        select(AnalysisSummary)
+        .where(AnalysisSummary.user_id == user_id)
+        .order_by(AnalysisSummary.analysis_type)
+    )
+    return result.scalars().all()
+
+
+async def save_job_async(db, job_id: str, **fields):
+    """Insert or update a background job row"""
+    await db.merge(AnalysisJob(id=job_id, **fields))
+    await db.commit()
+
+
+async def get_job_async(db, job_id: str):
+    """Get a background job by id"""
+    return await db.get(AnalysisJob, job_id)
+
+
+async def delete_finished_jobs_async(db, finished_before: datetime) -> int:
+    """Delete jobs that finished before the given time; returns how many"""
+    result = await db.execute(delete(AnalysisJob).where(AnalysisJob.finished_at < finished_before))
+    await db.commit()
+    return result.rowcount
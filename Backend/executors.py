@@ -0,0 +1,53 @@
+# executors.py - Dedicated thread pools for blocking model inference
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------------
+# Config
+# -------------------------
+# One bounded pool per model family so a slow MRI batch cannot starve CKD or
+# ASCVD requests, and none of them block the event loop.
+INFERENCE_WORKERS = {
+    "mri": int(os.getenv("MRI_INFERENCE_WORKERS", "2")),
+    "ckd": int(os.getenv("CKD_INFERENCE_WORKERS", "2")),
+    "ascvd": int(os.getenv("ASCVD_INFERENCE_WORKERS", "2")),
+}
+
+INFERENCE_EXECUTORS = {
+    family: ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"{family}-inference")
+    for family, workers in INFERENCE_WORKERS.items()
+}
+
+_pending = {family: 0 for family in INFERENCE_EXECUTORS}
+
+
+def get_executor(family: str) -> ThreadPoolExecutor:
+    """Return the inference pool for a model family ('mri', 'ckd' or 'ascvd')."""
+    return INFERENCE_EXECUTORS[family]
+
+
+async def run_inference(family: str, func, *args, **kwargs):
+    """Run a blocking function on the family's pool and await its result."""
+    loop = asyncio.get_running_loop()
+    _pending[family] += 1
+    try:
+        return await loop.run_in_executor(
+            INFERENCE_EXECUTORS[family], functools.partial(func, *args, **kwargs)
+        )
+    finally:
+        _pending[family] -= 1
+
+
+def executor_stats() -> dict:
+    return {
+        family: {"max_workers": executor._max_workers, "pending": _pending[family]}
+        for family, executor in INFERENCE_EXECUTORS.items()
+    }
+
+
+def shutdown_executors():
+    for executor in INFERENCE_EXECUTORS.values():
+        executor.shutdown(wait=True, cancel_futures=True)
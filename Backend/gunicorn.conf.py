@@ -0,0 +1,50 @@
+# gunicorn.conf.py - Pre-fork serving: load models once in the master, then fork workers
+#
+#   gunicorn app:app -c gunicorn.conf.py
+#
+# The app and the listed models are loaded before forking, so every worker
+# shares their memory copy-on-write instead of holding its own copy. Database
+# tables are created (and summaries backfilled) once here, not in every worker.
+
+import gc
+import os
+
+# -------------------------
+# Server
+# -------------------------
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Models loaded in the master before fork. TensorFlow's runtime threads do
+# not survive fork(), so MRI is loaded per worker unless added here.
+PRELOAD_MODELS = [name.strip() for name in os.getenv("PRELOAD_MODELS", "ckd,ascvd").split(",") if name.strip()]
+
+
+def on_starting(server):
+    from db import check_db_connection, engine, init_db
+
+    server.log.info("Initializing database before fork...")
+    try:
+        check_db_connection()
+        init_db()
+    except Exception as e:
+        server.log.warning(f"Database initialization failed: {e}")
+    finally:
+        # Workers open their own connections; none may be inherited from the master
+        engine.dispose()
+    # Read by the workers' startup hook (the app module is already imported by now)
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+
+
+def when_ready(server):
+    from model_loader import MODEL_LOADER
+
+    server.log.info(f"Preloading models before fork: {', '.join(PRELOAD_MODELS) or 'none'}")
+    MODEL_LOADER.preload(PRELOAD_MODELS)
+    # Keep the cyclic GC from touching (and so copying) every preloaded object in each worker
+    gc.freeze()
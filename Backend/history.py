@@ -0,0 +1,196 @@
+# history.py - Write-behind persistence for AnalysisHistory records
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from db import AnalysisHistory, AsyncSessionLocal, update_analysis_summaries_async
+
+# -------------------------
+# Config
+# -------------------------
+HISTORY_FLUSH_SIZE = int(os.getenv("HISTORY_FLUSH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL_MS = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "500"))
+HISTORY_BUFFER_MAX = int(os.getenv("HISTORY_BUFFER_MAX", "10000"))
+# How long a request may wait for buffer space before its record is dropped
+HISTORY_ENQUEUE_TIMEOUT_MS = float(os.getenv("HISTORY_ENQUEUE_TIMEOUT_MS", "100"))
+# Extra attempts for a batch whose transaction failed (e.g. a deadlock or lock timeout)
+HISTORY_FLUSH_RETRIES = int(os.getenv("HISTORY_FLUSH_RETRIES", "2"))
+
+# Queued by close(): the writer flushes what it holds and exits
+_STOP = object()
+
+
+class AnalysisHistoryWriter:
+    """
+    Buffers AnalysisHistory rows in memory and writes them as multi-row INSERTs,
+    updating the matching AnalysisSummary aggregates in the same transaction.
+
+    `record()` only appends to a bounded queue. A background task flushes once
+    `flush_size` rows are waiting or the oldest has waited `flush_interval_ms`.
+    When the buffer is full, callers wait up to `enqueue_timeout_ms` for space
+    (backpressure) and the row is dropped after that, so a slow database never
+    fails an analysis request. `close()` flushes everything still buffered.
+
+    A batch whose transaction fails is retried `flush_retries` times. If it
+    still fails, the history rows are inserted on their own, without the
+    summary update, rather than being lost.
+    """
+
+    def __init__(self, session_factory, flush_size: int = 200, flush_interval_ms: float = 500.0,
+                 max_buffer: int = 10000, enqueue_timeout_ms: float = 100.0, flush_retries: int = 2):
+        self.session_factory = session_factory
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_buffer = max(1, int(max_buffer))
+        self.enqueue_timeout = max(0.0, float(enqueue_timeout_ms)) / 1000.0
+        self.flush_retries = max(0, int(flush_retries))
+
+        self._queue = None
+        self._worker = None
+
+        # Stats
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.written_without_summary = 0
+        self.flushes = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def record(self, user_id: int, analysis_type: str, analysis_result: str = None,
+                     confidence_score: str = None, diagnosis: str = None,
+                     minio_image_path: str = None, minio_report_path: str = None) -> bool:
+        """Buffer one analysis record. Returns False if it was dropped because the buffer stayed full."""
+        self._ensure_started()
+        row = {
+            "user_id": user_id,
+            "analysis_type": analysis_type,
+            "analysis_result": analysis_result,
+            "confidence_score": confidence_score,
+            "diagnosis": diagnosis,
+            "minio_image_path": minio_image_path,
+            "minio_report_path": minio_report_path,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(row), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                print(f"WARNING: Analysis history buffer full, dropped {analysis_type} record for user {user_id}")
+                return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                if not self._queue.empty():
+                    row = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _write(self, rows, update_summaries: bool = True):
+        async with self.session_factory() as db:
+            # One executemany; SQLAlchemy sends it as multi-row INSERT ... VALUES batches
+            await db.execute(insert(AnalysisHistory), rows)
+            if update_summaries:
+                # Dashboard aggregates move in the same transaction as the rows
+                await update_analysis_summaries_async(db, rows)
+            await db.commit()
+
+    async def _flush(self, rows):
+        started = time.perf_counter()
+        for attempt in range(self.flush_retries + 1):
+            try:
+                await self._write(rows)
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.flush_retries:
+                    self.retries += 1
+                    print(f"WARNING: Writing {len(rows)} analysis history records failed, retrying: {e}")
+                    await asyncio.sleep(0.05 * 2 ** attempt)
+        else:
+            # Keep the history itself; only the dashboard summaries miss these rows
+            try:
+                await self._write(rows, update_summaries=False)
+                self.written_without_summary += len(rows)
+                print(f"ERROR: Wrote {len(rows)} analysis history records without updating summaries: {error}")
+            except Exception as e:
+                self.failed += len(rows)
+                print(f"ERROR: Failed to write {len(rows)} analysis history records: {e}")
+                return
+
+        self.written += len(rows)
+        self.flushes += 1
+        self.last_flush_rows = len(rows)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000.0
+
+    async def close(self):
+        """Flush everything still buffered, then stop the background task."""
+        if self._worker is None or self._worker.done():
+            return
+        # Queued behind pending rows, so the writer drains the buffer before exiting
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "max_buffer": self.max_buffer,
+            "flush_size": self.flush_size,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "written_without_summary": self.written_without_summary,
+            "flushes": self.flushes,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+HISTORY_WRITER = AnalysisHistoryWriter(
+    AsyncSessionLocal,
+    flush_size=HISTORY_FLUSH_SIZE,
+    flush_interval_ms=HISTORY_FLUSH_INTERVAL_MS,
+    max_buffer=HISTORY_BUFFER_MAX,
+    enqueue_timeout_ms=HISTORY_ENQUEUE_TIMEOUT_MS,
+    flush_retries=HISTORY_FLUSH_RETRIES,
+)
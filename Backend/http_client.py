@@ -0,0 +1,72 @@
+# http_client.py - Shared, pooled async HTTP clients for outbound calls
+
+import asyncio
+import os
+
+import httpx
+
+# -------------------------
+# Config
+# -------------------------
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "5"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "10"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.2"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# One client per upstream, so each host gets its own connection pool and limits
+_clients = {}
+
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """Return the shared keep-alive client for an upstream (e.g. 'news', 'google')."""
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        _clients[upstream] = client
+    return client
+
+
+async def get_with_retries(upstream: str, url: str, retries: int = HTTP_RETRIES, **kwargs) -> httpx.Response:
+    """
+    GET through the upstream's pooled client.
+
+    Transport errors, timeouts and 429/5xx gateway responses are retried with
+    exponential backoff. The last response is returned, or the last error raised.
+    """
+    client = get_http_client(upstream)
+    for attempt in range(retries + 1):
+        delay = HTTP_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+            await response.aclose()
+            await asyncio.sleep(delay)
+            continue
+        return response
+
+
+async def close_http_clients():
+    """Close every pooled client (call on shutdown)."""
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
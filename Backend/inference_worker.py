@@ -0,0 +1,269 @@
+# inference_worker.py - Standalone inference process and the API-side client
+#
+# Run one or more workers next to the API:
+#
+#   INFERENCE_WORKER_SOCKET=/tmp/healthai-inference-0.sock python inference_worker.py
+#
+# and start the API with INFERENCE_BACKEND=remote and
+# INFERENCE_WORKER_SOCKETS=/tmp/healthai-inference-0.sock[,...]. The worker owns
+# the MRI, CKD and ASCVD models; the API process only decodes uploads and sends
+# arrays over the Unix socket, so a model crash never takes down a web worker.
+
+import itertools
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+# -------------------------
+# Config
+# -------------------------
+INFERENCE_WORKER_SOCKET = os.getenv("INFERENCE_WORKER_SOCKET", "/tmp/healthai-inference.sock")
+INFERENCE_WORKER_SOCKETS = [
+    path.strip() for path in os.getenv("INFERENCE_WORKER_SOCKETS", INFERENCE_WORKER_SOCKET).split(",") if path.strip()
+]
+# Both ends must share this key; messages are pickled, so it should be secret
+INFERENCE_WORKER_AUTHKEY = os.getenv(
+    "INFERENCE_WORKER_AUTHKEY", os.getenv("JWT_SECRET_KEY", "healthai-inference")
+).encode()
+INFERENCE_WORKER_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_WORKER_TIMEOUT_SECONDS", "60"))
+INFERENCE_WORKER_READY_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_WORKER_READY_TIMEOUT_SECONDS", "120"))
+INFERENCE_WORKER_HEARTBEAT_SECONDS = float(os.getenv("INFERENCE_WORKER_HEARTBEAT_SECONDS", "2"))
+
+
+class InferenceWorkerUnavailable(Exception):
+    """No inference worker could be reached, or one died mid-request."""
+
+
+class InferenceWorkerError(Exception):
+    """The inference worker ran the request and it failed."""
+
+
+# -------------------------
+# Client (API process)
+# -------------------------
+class InferenceClient:
+    """
+    Thread-safe client for a pool of inference workers.
+
+    `call()` is blocking and is meant to run on the inference executors. Each
+    worker socket keeps a small pool of open connections; requests go
+    round-robin across sockets and move on to the next one if a worker is
+    down. A background heartbeat keeps per-model readiness fresh for
+    `is_ready()` without blocking the event loop.
+    """
+
+    def __init__(self, addresses, authkey: bytes, timeout: float = 60.0, heartbeat_seconds: float = 2.0):
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.timeout = float(timeout)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self._lock = threading.Lock()
+        self._reset()
+
+        # Stats
+        self.calls = 0
+        self.errors = 0
+        self.unavailable = 0
+        self.total_ms = 0.0
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {address: [] for address in self.addresses}
+        self._next_address = itertools.cycle(self.addresses)
+        self._status = {}
+        self._heartbeat = None
+
+    def _check_fork(self):
+        # Connections and the heartbeat thread do not survive fork (pre-fork servers)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _acquire(self, address):
+        """Return (connection, pooled): an idle connection if there is one, else a new one."""
+        with self._lock:
+            if self._idle[address]:
+                return self._idle[address].pop(), True
+        return Client(address, family="AF_UNIX", authkey=self.authkey), False
+
+    def _release(self, address, conn):
+        with self._lock:
+            self._idle[address].append(conn)
+
+    def _request(self, address, message):
+        while True:
+            conn, pooled = self._acquire(address)
+            try:
+                conn.send(message)
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"no reply from {address} within {self.timeout:.0f}s")
+                status, payload = conn.recv()
+            except TimeoutError:
+                conn.close()
+                raise
+            except (OSError, EOFError):
+                conn.close()
+                # A pooled connection may predate a worker restart; requests are idempotent, so retry fresh
+                if pooled:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            self._release(address, conn)
+            return status, payload
+
+    def call(self, op: str, *args):
+        """Run `op` on a worker and return its result."""
+        self._check_fork()
+        started = time.perf_counter()
+        last_error = None
+        for _ in range(len(self.addresses)):
+            address = next(self._next_address)
+            try:
+                status, payload = self._request(address, (op, args))
+            except (OSError, EOFError, TimeoutError) as e:
+                last_error = e
+                continue
+
+            self.calls += 1
+            self.total_ms += (time.perf_counter() - started) * 1000.0
+            if status == "error":
+                self.errors += 1
+                raise InferenceWorkerError(payload)
+            return payload
+
+        self.unavailable += 1
+        raise InferenceWorkerUnavailable(f"No inference worker available: {last_error}")
+
+    def _poll_status(self):
+        for address in self.addresses:
+            try:
+                status, payload = self._request(address, ("status", ()))
+                if status == "ok":
+                    self._status = payload
+                    return
+            except (OSError, EOFError, TimeoutError):
+                continue
+        self._status = {}
+
+    def _heartbeat_loop(self):
+        while self._heartbeat is threading.current_thread():
+            self._poll_status()
+            time.sleep(self.heartbeat_seconds)
+
+    def _ensure_heartbeat(self):
+        self._check_fork()
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="inference-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def is_ready(self, model: str) -> bool:
+        """Whether a reachable worker reported `model` ready at the last heartbeat."""
+        self._ensure_heartbeat()
+        return self._status.get("models", {}).get(model, {}).get("state") == "ready"
+
+    def wait_ready(self, model: str, timeout: float = 120.0) -> dict:
+        """Block until a worker reports `model` loaded (or failed). Returns the worker status."""
+        self._ensure_heartbeat()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._poll_status()
+            state = self._status.get("models", {}).get(model, {}).get("state")
+            if state in ("ready", "failed"):
+                return self._status
+            time.sleep(0.5)
+        print(f"WARNING: Inference worker did not report '{model}' ready within {timeout:.0f}s")
+        return self._status
+
+    def status(self) -> dict:
+        return self._status
+
+    def close(self):
+        """Stop the heartbeat and close idle connections (call on shutdown)."""
+        with self._lock:
+            self._heartbeat = None
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+                connections.clear()
+
+    def stats(self) -> dict:
+        return {
+            "addresses": self.addresses,
+            "calls": self.calls,
+            "errors": self.errors,
+            "unavailable": self.unavailable,
+            "avg_latency_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "worker_models": self._status.get("models", {}),
+        }
+
+
+# -------------------------
+# Worker (inference process)
+# -------------------------
+def _handle_connection(conn, handlers, status):
+    with conn:
+        while True:
+            try:
+                op, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if op == "status":
+                    reply = ("ok", status())
+                else:
+                    reply = ("ok", handlers[op](*args))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except (OSError, EOFError):
+                return
+
+
+def serve(address: str = INFERENCE_WORKER_SOCKET):
+    """Load the models and answer inference requests on a Unix socket, one thread per connection."""
+    # The worker always runs the models itself
+    os.environ["INFERENCE_BACKEND"] = "local"
+    import app
+
+    handlers = {
+        "mri": app.predict_mri_batch,
+        "ckd": app.score_ckd_rows,
+        "ascvd": app.predict_ascvd_matrix,
+    }
+
+    def status():
+        stats = app.MODEL_LOADER.stats()
+        stats["mri_model_version"] = app.MRI_MODEL_VERSION
+        stats["pid"] = os.getpid()
+        return stats
+
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family="AF_UNIX", authkey=INFERENCE_WORKER_AUTHKEY)
+    os.chmod(address, 0o600)
+    print(f"INFO: Inference worker {os.getpid()} listening on {address}")
+
+    # Load in the background so status requests are answered while models load
+    app.MODEL_LOADER.start()
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError) as e:
+                # Bad authkey or a client that hung up during the handshake
+                print(f"WARNING: Rejected inference connection: {e}")
+                continue
+            threading.Thread(target=_handle_connection, args=(conn, handlers, status), daemon=True).start()
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1] if len(sys.argv) > 1 else INFERENCE_WORKER_SOCKET)
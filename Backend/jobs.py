@@ -0,0 +1,343 @@
+# jobs.py - Background jobs for long-running analyses
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from db import AsyncSessionLocal, save_job_async, get_job_async, delete_finished_jobs_async
+
+# -------------------------
+# Config
+# -------------------------
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs are kept this long for polling, and at most JOB_MAX_RETAINED of them
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "10000"))
+# 'database' shares job state through the analysis_jobs table, so a poll can
+# hit any server process; 'memory' only works with a single process
+JOB_STORE = os.getenv("JOB_STORE", "database")
+# How often a poll for a job running in another process re-reads it
+JOB_STORE_POLL_SECONDS = float(os.getenv("JOB_STORE_POLL_SECONDS", "1"))
+
+
+class JobQueueFull(Exception):
+    """The job queue is at JOB_QUEUE_MAX."""
+
+
+class Job:
+    """One submitted analysis. `run` is awaited by a worker; its return value becomes `result`."""
+
+    def __init__(self, kind: str, run: Optional[Callable[[], Awaitable[Any]]], user_id: Optional[int] = None,
+                 job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._run = run
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("succeeded", "failed")
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the job to finish. Returns whether it has."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.done
+
+    def to_dict(self) -> dict:
+        payload = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.state == "succeeded":
+            payload["result"] = self.result
+        elif self.state == "failed":
+            payload["error"] = self.error
+        return payload
+
+
+def _json_default(value):
+    # numpy arrays and scalars in job results
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(timestamp) if timestamp is not None else None
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    return (value - datetime(1970, 1, 1)).total_seconds() if value is not None else None
+
+
+class DatabaseJobStore:
+    """
+    Mirrors job state into the analysis_jobs table so every server process
+    can answer polls for it. Results are stored as JSON (numpy arrays as lists).
+    Failures are logged, never raised: the job still runs and is visible to
+    the process that accepted it.
+    """
+
+    async def save(self, job: Job):
+        try:
+            result = json.dumps(job.result, default=_json_default) if job.state == "succeeded" else None
+            async with AsyncSessionLocal() as db:
+                await save_job_async(
+                    db, job.id,
+                    kind=job.kind,
+                    user_id=job.user_id,
+                    state=job.state,
+                    result=result,
+                    error=job.error,
+                    created_at=_to_datetime(job.created_at),
+                    started_at=_to_datetime(job.started_at),
+                    finished_at=_to_datetime(job.finished_at),
+                )
+        except Exception as e:
+            print(f"ERROR: Could not save {job.kind} job {job.id}: {e}")
+
+    async def load(self, job_id: str) -> Optional[Job]:
+        try:
+            async with AsyncSessionLocal() as db:
+                record = await get_job_async(db, job_id)
+        except Exception as e:
+            print(f"ERROR: Could not load job {job_id}: {e}")
+            return None
+        if record is None:
+            return None
+        job = Job(record.kind, None, user_id=record.user_id, job_id=record.id)
+        job.state = record.state
+        job.result = json.loads(record.result) if record.result is not None else None
+        job.error = record.error
+        job.created_at = _to_timestamp(record.created_at)
+        job.started_at = _to_timestamp(record.started_at)
+        job.finished_at = _to_timestamp(record.finished_at)
+        return job
+
+    async def prune(self, finished_before: float):
+        try:
+            async with AsyncSessionLocal() as db:
+                await delete_finished_jobs_async(db, _to_datetime(finished_before))
+        except Exception as e:
+            print(f"ERROR: Could not prune finished jobs: {e}")
+
+
+class JobManager:
+    """
+    Bounded queue of analysis jobs run by a fixed number of async workers.
+
+    `submit()` never waits for the queue: it raises JobQueueFull once
+    `max_queue` jobs are waiting, so callers can shed load instead of piling
+    up connections. Jobs run in the process that accepted them and are kept
+    in memory until `result_ttl_seconds` after they finish; with a `store`,
+    each state change is also saved there, and `find()` / `wait()` fall back
+    to it for jobs owned by another process. The heavy work inside a job
+    still runs on the model executors, so `workers` only caps how many jobs
+    are in progress.
+    """
+
+    def __init__(self, max_queue: int = 100, workers: int = 4, result_ttl_seconds: float = 3600.0,
+                 max_retained: int = 10000, store: Optional[DatabaseJobStore] = None,
+                 store_poll_seconds: float = 1.0):
+        self.max_queue = max(1, int(max_queue))
+        self.workers = max(1, int(workers))
+        self.result_ttl_seconds = float(result_ttl_seconds)
+        self.max_retained = max(1, int(max_retained))
+        self.store = store
+        self.store_poll_seconds = max(0.05, float(store_poll_seconds))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._last_prune = 0.0
+        self._last_store_prune = 0.0
+
+        # Stats
+        self.submitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._total_wait_ms = 0.0
+        self._total_run_ms = 0.0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        # Replace dead workers; jobs already queued stay in the same queue
+        self._tasks = [task for task in self._tasks if not task.done()]
+        if len(self._tasks) < self.workers:
+            loop = asyncio.get_running_loop()
+            self._tasks += [loop.create_task(self._work()) for _ in range(self.workers - len(self._tasks))]
+
+    async def submit(self, kind: str, run: Callable[[], Awaitable[Any]], user_id: Optional[int] = None) -> Job:
+        """Queue a job. Raises JobQueueFull instead of waiting when the queue is full."""
+        self._ensure_started()
+        self._prune()
+        await self._prune_store()
+        if self._queue.full():
+            self.rejected += 1
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already queued")
+        job = Job(kind, run, user_id=user_id)
+        # Saved before it is queued, so a worker's "running" update always lands after it
+        await self._save(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Filled up while the job was being saved
+            self.rejected += 1
+            job.state = "failed"
+            job.error = "Job queue full"
+            job.finished_at = time.time()
+            await self._save(job)
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already queued")
+        self._jobs[job.id] = job
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job accepted by this process (no store lookup)."""
+        return self._jobs.get(job_id)
+
+    async def find(self, job_id: str) -> Optional[Job]:
+        """A job by id, from this process or, failing that, the store."""
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = await self.store.load(job_id)
+        return job
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """
+        Wait up to `timeout` seconds for a job to finish and return its latest state.
+        Jobs owned by another process are re-read from the store every `store_poll_seconds`.
+        """
+        if job.done:
+            return job
+        if self._jobs.get(job.id) is job or self.store is None:
+            await job.wait(timeout)
+            return job
+        deadline = time.monotonic() + timeout
+        while not job.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(self.store_poll_seconds, remaining))
+            job = await self.store.load(job.id) or job
+        return job
+
+    async def _save(self, job: Job):
+        if self.store is not None:
+            await self.store.save(job)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job.state = "running"
+            job.started_at = time.time()
+            self.running += 1
+            try:
+                await self._save(job)
+                job.result = await job._run()
+                job.state = "succeeded"
+                self.succeeded += 1
+            except Exception as e:
+                job.error = str(e)
+                job.state = "failed"
+                self.failed += 1
+                print(f"ERROR: {job.kind} job {job.id} failed: {e}")
+            finally:
+                if not job.done:
+                    # The worker was cancelled (e.g. at shutdown) while running it
+                    job.error = "Job was cancelled"
+                    job.state = "failed"
+                    self.failed += 1
+                self.running -= 1
+                job.finished_at = time.time()
+                job._run = None  # drop references to uploads held by the closure
+                self._total_wait_ms += (job.started_at - job.created_at) * 1000.0
+                self._total_run_ms += (job.finished_at - job.started_at) * 1000.0
+                job._done.set()
+                await self._save(job)
+
+    def _prune(self):
+        """Drop finished jobs past their TTL, and the oldest finished ones beyond max_retained."""
+        now = time.time()
+        excess = len(self._jobs) + 1 - self.max_retained
+        if excess <= 0 and now - self._last_prune < 1.0:
+            return
+        self._last_prune = now
+        for job_id, job in list(self._jobs.items()):
+            if job.done and (excess > 0 or now - job.finished_at > self.result_ttl_seconds):
+                del self._jobs[job_id]
+                excess -= 1
+
+    async def _prune_store(self):
+        """Delete stored jobs past their TTL, at most once a minute."""
+        now = time.time()
+        if self.store is None or now - self._last_store_prune < 60.0:
+            return
+        self._last_store_prune = now
+        await self.store.prune(now - self.result_ttl_seconds)
+
+    def stats(self) -> dict:
+        finished = self.succeeded + self.failed
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "store": "database" if self.store is not None else "memory",
+            "running": self.running,
+            "retained": len(self._jobs),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "avg_queue_wait_ms": self._total_wait_ms / finished if finished else 0.0,
+            "avg_run_ms": self._total_run_ms / finished if finished else 0.0,
+        }
+
+    async def close(self):
+        """Stop the workers; unfinished jobs are marked failed."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._jobs.values():
+            if not job.done:
+                job.state = "failed"
+                job.error = "Server shutting down"
+                job.finished_at = time.time()
+                job._done.set()
+                await self._save(job)
+
+
+if JOB_STORE == "memory" and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    print("WARNING: JOB_STORE=memory with WEB_CONCURRENCY > 1; job polls that reach another worker will 404")
+
+JOB_MANAGER = JobManager(
+    max_queue=JOB_QUEUE_MAX,
+    workers=JOB_WORKERS,
+    result_ttl_seconds=JOB_RESULT_TTL_SECONDS,
+    max_retained=JOB_MAX_RETAINED,
+    store=DatabaseJobStore() if JOB_STORE != "memory" else None,
+    store_poll_seconds=JOB_STORE_POLL_SECONDS,
+)
@@ -0,0 +1,145 @@
+# model_loader.py - Parallel, background and lazy model loading with per-model state
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------------
+# Config
+# -------------------------
+# 'background': start every load at startup without blocking it (server binds at once)
+# 'eager':      load everything in parallel before startup finishes
+# 'lazy':       load each model on its first request
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background")
+# Comma-separated model names that always load on first use (e.g. "mri")
+MODEL_LOAD_LAZY = {name.strip() for name in os.getenv("MODEL_LOAD_LAZY", "").split(",") if name.strip()}
+MODEL_LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", "3"))
+# How long a request waits for a model that is still loading before getting a 503
+MODEL_LOAD_WAIT_SECONDS = float(os.getenv("MODEL_LOAD_WAIT_SECONDS", "30"))
+
+
+class ModelLoader:
+    """
+    Loads models concurrently on a small thread pool and tracks their state.
+
+    Each model is registered with a `load` function (which sets the app's
+    globals, as before) and an `is_ready` check. States are 'pending',
+    'lazy', 'loading', 'ready' or 'failed', with load time in ms. A model
+    is loaded at most once; `ensure_loaded` starts a lazy load or waits for
+    one already running.
+    """
+
+    def __init__(self, mode: str = "background", lazy=(), max_workers: int = 3,
+                 wait_seconds: float = 30.0):
+        self.mode = mode
+        self.lazy = set(lazy)
+        self.max_workers = max(1, int(max_workers))
+        self.wait_seconds = float(wait_seconds)
+        self._models = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._started_at = None
+        self.startup_ms = None  # wall time from start() until the last startup load finished
+
+    def register(self, name: str, load, is_ready):
+        lazy = self.mode == "lazy" or name in self.lazy
+        self._models[name] = {
+            "load": load,
+            "is_ready": is_ready,
+            "state": "lazy" if lazy else "pending",
+            "load_ms": None,
+            "error": None,
+        }
+
+    def start(self, wait: bool = False):
+        """Start loading every non-lazy model; with wait=True, block until they finish."""
+        self._started_at = time.perf_counter()
+        futures = [self._submit(name) for name, model in self._models.items() if model["state"] != "lazy"]
+        if wait:
+            for future in futures:
+                future.result()
+
+    def preload(self, names):
+        """
+        Load the named models in parallel and stop the load threads.
+
+        Meant for a pre-fork master (see gunicorn.conf.py): workers inherit the
+        loaded models copy-on-write, and no loader threads are left to fork.
+        """
+        self._started_at = time.perf_counter()
+        futures = [self._submit(name) for name in names if name in self._models]
+        for future in futures:
+            future.result()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _submit(self, name: str):
+        with self._lock:
+            future = self._futures.get(name)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-load")
+                self._models[name]["state"] = "loading"
+                future = self._executor.submit(self._load, name)
+                self._futures[name] = future
+            return future
+
+    def _load(self, name: str):
+        model = self._models[name]
+        started = time.perf_counter()
+        try:
+            model["load"]()
+        except Exception as e:
+            model["error"] = str(e)
+        model["load_ms"] = (time.perf_counter() - started) * 1000.0
+        model["state"] = "ready" if model["is_ready"]() else "failed"
+        if self._started_at is not None and not any(m["state"] == "loading" for m in self._models.values()):
+            self.startup_ms = (time.perf_counter() - self._started_at) * 1000.0
+        print(f"INFO: Model '{name}' {model['state']} in {model['load_ms']:.0f} ms")
+
+    async def ensure_loaded(self, name: str) -> bool:
+        """True once the model is usable. Starts a lazy load, or waits (bounded) for a running one."""
+        model = self._models[name]
+        if model["is_ready"]():
+            return True
+        if model["state"] == "failed":
+            return False
+        future = self._submit(name)
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_seconds)
+        except asyncio.TimeoutError:
+            return False
+        return model["is_ready"]()
+
+    def is_ready(self, name: str) -> bool:
+        return self._models[name]["is_ready"]()
+
+    def state(self, name: str) -> str:
+        return self._models[name]["state"]
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "startup_ms": self.startup_ms,
+            "models": {
+                name: {"state": model["state"], "load_ms": model["load_ms"], "error": model["error"]}
+                for name, model in self._models.items()
+            },
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+MODEL_LOADER = ModelLoader(
+    mode=MODEL_LOAD_MODE,
+    lazy=MODEL_LOAD_LAZY,
+    max_workers=MODEL_LOAD_WORKERS,
+    wait_seconds=MODEL_LOAD_WAIT_SECONDS,
+)
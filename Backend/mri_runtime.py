@@ -0,0 +1,140 @@
+# mri_runtime.py - CPU runtimes for the MRI classifier (TF SavedModel or quantized TFLite)
+
+import os
+import threading
+
+import numpy as np
+
+# -------------------------
+# Config
+# -------------------------
+# 'savedmodel' runs the serving signature in float32; 'tflite' runs a converted, quantized graph
+MRI_RUNTIME = os.getenv("MRI_RUNTIME", "savedmodel")
+# dynamic: int8 weights, float activations | float16: half-size weights | int8: full integer (needs calibration images) | none
+MRI_TFLITE_QUANTIZATION = os.getenv("MRI_TFLITE_QUANTIZATION", "dynamic")
+MRI_TFLITE_PATH = os.getenv(
+    "MRI_TFLITE_PATH", os.path.join(os.path.dirname(__file__), f"mri_{MRI_TFLITE_QUANTIZATION}.tflite")
+)
+MRI_TFLITE_THREADS = int(os.getenv("MRI_TFLITE_THREADS", str(os.cpu_count() or 1)))
+
+TFLITE_QUANTIZATIONS = ("dynamic", "float16", "int8", "none")
+
+
+class SavedModelRunner:
+    """The SavedModel 'serving_default' signature, called with a float32 (n, 128, 128, 3) batch."""
+
+    runtime = "savedmodel"
+
+    def __init__(self, model_dir: str):
+        import tensorflow as tf
+
+        self._tf = tf
+        self.signature = tf.saved_model.load(model_dir).signatures["serving_default"]
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        # Signatures need a TF tensor, not a NumPy array
+        prediction = self.signature(self._tf.constant(batch, dtype=self._tf.float32))
+        if isinstance(prediction, dict):
+            # Extract the first output tensor (usually 'dense_X' or 'output_0')
+            prediction = next(iter(prediction.values()))
+        return prediction.numpy()
+
+
+def _tflite_interpreter(model_path: str, num_threads: int):
+    # Prefer the standalone runtime if it is installed; fall back to the one bundled with TF
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+class TFLiteRunner:
+    """
+    A converted TFLite graph with the same call signature as SavedModelRunner.
+
+    The interpreter is not thread-safe, so calls are serialized; the input is
+    resized whenever the batch size changes. Fully integer (int8) models get
+    their input quantized and output dequantized here.
+    """
+
+    runtime = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = 1):
+        self.model_path = model_path
+        self.interpreter = _tflite_interpreter(model_path, max(1, num_threads))
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = batch.shape[0]
+
+            input_dtype = self._input["dtype"]
+            if input_dtype != np.float32:
+                scale, zero_point = self._input["quantization"]
+                batch = np.round(batch / scale + zero_point).astype(input_dtype)
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output["index"])
+
+            if output.dtype != np.float32:
+                scale, zero_point = self._output["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output
+
+
+def convert_saved_model(model_dir: str, quantization: str = "dynamic", representative_batches=None) -> bytes:
+    """
+    Convert the MRI SavedModel to a TFLite flatbuffer.
+
+    `representative_batches` (an iterable of float32 (1, 128, 128, 3) arrays)
+    is required for 'int8' calibration.
+    """
+    import tensorflow as tf
+
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}', expected one of: {', '.join(TFLITE_QUANTIZATIONS)}")
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(model_dir, signature_keys=["serving_default"])
+    if quantization == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if representative_batches is None:
+            raise ValueError("int8 quantization needs representative images for calibration")
+        batches = list(representative_batches)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([batch] for batch in batches)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def load_mri_runner(model_dir: str, runtime: str = MRI_RUNTIME, tflite_path: str = MRI_TFLITE_PATH,
+                    num_threads: int = MRI_TFLITE_THREADS):
+    """
+    Load the configured MRI runtime.
+
+    Falls back to the SavedModel if 'tflite' is requested but the converted
+    file is missing (see convert_mri_model.py).
+    """
+    if runtime == "tflite":
+        if os.path.exists(tflite_path):
+            return TFLiteRunner(tflite_path, num_threads=num_threads)
+        print(f"WARNING: MRI_RUNTIME=tflite but {tflite_path} does not exist; using the SavedModel")
+    elif runtime != "savedmodel":
+        print(f"WARNING: Unknown MRI_RUNTIME '{runtime}'; using the SavedModel")
+    return SavedModelRunner(model_dir)
@@ -0,0 +1,115 @@
+# passwords.py - bcrypt hashing on a dedicated, size-capped worker pool
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+# -------------------------
+# Config
+# -------------------------
+# 'process' escapes the GIL; 'thread' avoids extra processes on tiny hosts
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "process")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Requests beyond this many queued/running hashes are rejected immediately
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordPoolSaturated(Exception):
+    """Too many password hashes are already queued."""
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+# -------------------------
+# Worker Pool
+# -------------------------
+_executor = None
+_pending = 0
+_stats = {"completed": 0, "failed": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        workers = max(1, PASSWORD_HASH_WORKERS)
+        if PASSWORD_HASH_POOL == "process":
+            # spawn: workers import only this module, not the forked app/TF state
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return _executor
+
+
+async def _run(func, *args):
+    global _pending, _executor
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise PasswordPoolSaturated(f"{_pending} password hashes already pending")
+
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    except BaseException as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died; start a fresh pool for the next request
+            _executor = None
+        _stats["failed"] += 1
+        raise
+    finally:
+        _pending -= 1
+
+    # Latency covers successful calls only
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    _stats["completed"] += 1
+    _stats["total_ms"] += elapsed_ms
+    _stats["last_ms"] = elapsed_ms
+    _stats["max_ms"] = max(_stats["max_ms"], elapsed_ms)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the pool. Raises PasswordPoolSaturated when the queue is full."""
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the pool. Raises PasswordPoolSaturated when the queue is full."""
+    return await _run(check_password, plain_password, hashed_password)
+
+
+def password_pool_stats() -> dict:
+    completed = _stats["completed"]
+    return {
+        "pool": PASSWORD_HASH_POOL,
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "pending": _pending,
+        "completed": completed,
+        "failed": _stats["failed"],
+        "rejected": _stats["rejected"],
+        "avg_latency_ms": _stats["total_ms"] / completed if completed else 0.0,
+        "last_latency_ms": _stats["last_ms"],
+        "max_latency_ms": _stats["max_ms"],
+    }
+
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,65 @@
+# recommendations.py - Read-only registry of ASCVD disease recommendations
+
+import json
+import os
+from types import MappingProxyType
+from typing import Mapping
+
+RECOMMENDATIONS_PATH = os.getenv(
+    "RECOMMENDATIONS_PATH", os.path.join(os.path.dirname(__file__), "recommendations.json")
+)
+
+
+def dump_json(value) -> str:
+    """Serialize like starlette's JSONResponse (compact, UTF-8, no NaN/Infinity)."""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+class RecommendationRegistry:
+    """
+    Disease map and recommendations loaded once from a JSON data file.
+
+    Clinicians edit `recommendations.json` (and bump its `version`) instead of
+    code. Everything is exposed read-only, and each recommendation is also
+    kept as a pre-serialized JSON fragment so responses can embed it without
+    re-encoding the same static text on every request.
+    """
+
+    def __init__(self, version: str, disease_map: dict, recommendations: dict, default: str = "Unknown"):
+        if default not in recommendations:
+            raise ValueError(f"Recommendations must include the default disease '{default}'")
+
+        self.version = str(version)
+        self.default = default
+        self.disease_map = MappingProxyType({int(code): name for code, name in disease_map.items()})
+        self.recommendations = MappingProxyType({
+            disease: MappingProxyType(dict(entry)) for disease, entry in recommendations.items()
+        })
+        self._fragments = MappingProxyType({
+            disease: dump_json(entry) for disease, entry in recommendations.items()
+        })
+
+    @classmethod
+    def load(cls, path: str = RECOMMENDATIONS_PATH) -> "RecommendationRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        registry = cls(
+            version=data["version"],
+            disease_map=data["disease_map"],
+            recommendations=data["recommendations"],
+            default=data.get("default", "Unknown"),
+        )
+        print(f"INFO: Loaded recommendations v{registry.version} from {path}")
+        return registry
+
+    def disease_for(self, code) -> str:
+        """Map a model output code to a disease name."""
+        return self.disease_map.get(int(code), self.default)
+
+    def get(self, disease: str) -> Mapping:
+        """Read-only recommendation for a disease (falls back to the default entry)."""
+        return self.recommendations.get(disease, self.recommendations[self.default])
+
+    def fragment(self, disease: str) -> str:
+        """Pre-serialized JSON for a disease's recommendation."""
+        return self._fragments.get(disease, self._fragments[self.default])
@@ -27,5 +27,9 @@ echo "📦 Initializing database..."
 python -c "from db import init_db; init_db()"
 
 # Start server
-echo "🌐 Starting server..."
+# SERVER_MODE=prefork: gunicorn loads models once, then forks WEB_CONCURRENCY workers that share them
+echo "🌐 Starting server (mode: ${SERVER_MODE:-uvicorn})..."
+if [ "${SERVER_MODE:-uvicorn}" = "prefork" ]; then
+    exec gunicorn app:app -c gunicorn.conf.py
+fi
 exec uvicorn app:app --host 0.0.0.0 --port 8000 --workers 1
\ No newline at end of file
@@ -0,0 +1,70 @@
+# test_ascvd_features.py - feature_extraction_array must match the pandas feature_extraction exactly
+
+import numpy as np
+import pandas as pd
+
+from app import ASCVD_FEATURE_COLUMNS, ASCVD_INPUT_FIELDS, feature_extraction, feature_extraction_array
+
+
+def reference_features(X: np.ndarray) -> np.ndarray:
+    df = pd.DataFrame(X, columns=ASCVD_INPUT_FIELDS)
+    result = feature_extraction(df)
+    assert list(result.columns) == ASCVD_FEATURE_COLUMNS
+    return result.to_numpy(dtype=np.float64)
+
+
+def assert_bit_identical(X: np.ndarray):
+    expected = reference_features(X)
+    actual = feature_extraction_array(X)
+    assert actual.shape == expected.shape
+    assert actual.dtype == np.float64
+    # Same bits, including inf and nan from zero denominators
+    np.testing.assert_array_equal(actual.view(np.uint64), expected.view(np.uint64))
+
+
+def test_random_rows_match():
+    rng = np.random.default_rng(0)
+    low = np.array([50, 3, 80, 50, 30, 20, 40, 7, 60], dtype=np.float64)
+    high = np.array([400, 14, 200, 130, 250, 100, 600, 18, 110], dtype=np.float64)
+    X = rng.uniform(low, high, size=(5000, len(ASCVD_INPUT_FIELDS)))
+    assert_bit_identical(X)
+
+
+def test_zero_denominators_match():
+    base = [100, 5.5, 120, 80, 100, 50, 150, 14, 90]
+    rows = []
+    for field in ("HbA1C", "HDL", "MCV"):
+        row = list(base)
+        row[ASCVD_INPUT_FIELDS.index(field)] = 0
+        rows.append(row)
+        # 0 / 0 gives nan rather than inf
+        row = list(row)
+        row[ASCVD_INPUT_FIELDS.index({"HbA1C": "blood_glucose", "HDL": "LDL", "MCV": "Haemoglobin"}[field])] = 0
+        rows.append(row)
+    rows.append([0] * len(ASCVD_INPUT_FIELDS))
+    assert_bit_identical(np.array(rows, dtype=np.float64))
+
+
+def test_threshold_rows_match():
+    base = [100, 5.5, 120, 80, 100, 50, 150, 14, 90]
+    rows = [base]
+    # Values exactly on, just below and just above each flag threshold
+    for field, threshold in (("Systolic_BP", 140), ("Diastolic_BP", 90), ("Haemoglobin", 12), ("MCV", 80)):
+        for value in (threshold, np.nextafter(threshold, -np.inf), np.nextafter(threshold, np.inf)):
+            row = list(base)
+            row[ASCVD_INPUT_FIELDS.index(field)] = value
+            rows.append(row)
+    X = np.array(rows, dtype=np.float64)
+    assert_bit_identical(X)
+
+    features = feature_extraction_array(X)
+    hypertension = features[:, ASCVD_FEATURE_COLUMNS.index("hypertension_flag")]
+    assert hypertension[1] == 1 and hypertension[2] == 0  # systolic == 140 counts
+    assert hypertension[4] == 1 and hypertension[5] == 0  # diastolic == 90 counts
+    anaemia = features[:, ASCVD_FEATURE_COLUMNS.index("anaemia_flag")]
+    assert anaemia[7] == 0 and anaemia[8] == 1  # haemoglobin == 12 does not count
+
+
+def test_single_row_is_promoted_to_a_matrix():
+    row = np.array([100, 5.5, 120, 80, 100, 50, 150, 14, 90], dtype=np.float64)
+    np.testing.assert_array_equal(feature_extraction_array(row), feature_extraction_array(row[np.newaxis, :]))
@@ -0,0 +1,85 @@
+# test_batching.py - MicroBatcher groups concurrent requests and routes each result back to its caller
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+def run_concurrent(batcher: MicroBatcher, samples):
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.submit(sample) for sample in samples))
+        finally:
+            await batcher.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_batched_and_results_routed():
+    batch_sizes = []
+    gate = threading.Event()
+
+    def predict(batch):
+        # Hold the first batch so the remaining requests queue up behind it
+        gate.wait(timeout=1)
+        batch_sizes.append(len(batch))
+        return [float(row[0]) * 10 for row in batch]
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    batcher = MicroBatcher("test", predict, max_batch_size=4, max_wait_ms=20, executor=executor)
+    samples = [np.array([i], dtype=np.float32) for i in range(10)]
+
+    async def main():
+        try:
+            pending = asyncio.gather(*(batcher.submit(sample) for sample in samples))
+            await asyncio.sleep(0.05)
+            gate.set()
+            return await pending
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(main())
+    executor.shutdown()
+
+    assert results == [i * 10.0 for i in range(10)]
+    assert sum(batch_sizes) == 10
+    assert max(batch_sizes) <= 4
+    assert len(batch_sizes) < 10  # requests actually shared model calls
+    assert batcher.stats()["items"] == 10
+
+
+def test_batch_failure_reaches_every_caller():
+    def predict(batch):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher("test", predict, max_batch_size=8, max_wait_ms=5)
+
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(batcher.submit(np.zeros(1)) for _ in range(3)), return_exceptions=True
+            )
+        finally:
+            await batcher.close()
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["errors"] >= 1
+
+
+def test_custom_collate_is_used():
+    seen = []
+
+    def collate(samples):
+        seen.append(len(samples))
+        return np.stack(samples) * 2
+
+    batcher = MicroBatcher("test", lambda batch: list(batch[:, 0]), max_batch_size=4, max_wait_ms=20,
+                           collate=collate)
+    results = run_concurrent(batcher, [np.array([i], dtype=np.float32) for i in range(4)])
+
+    assert results == [0.0, 2.0, 4.0, 6.0]
+    assert sum(seen) == 4
@@ -0,0 +1,75 @@
+# test_jobs.py - Jobs accepted by one process can be polled from another through the job store
+
+import asyncio
+import copy
+
+from jobs import Job, JobManager
+
+
+class SharedStore:
+    """Stands in for DatabaseJobStore: snapshots of every job, shared by all managers."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def save(self, job: Job):
+        snapshot = Job(job.kind, None, user_id=job.user_id, job_id=job.id)
+        for name in ("state", "result", "error", "created_at", "started_at", "finished_at"):
+            setattr(snapshot, name, copy.deepcopy(getattr(job, name)))
+        self.rows[job.id] = snapshot
+
+    async def load(self, job_id: str):
+        return self.rows.get(job_id)
+
+    async def prune(self, finished_before: float):
+        pass
+
+
+def test_job_is_visible_and_awaitable_from_another_manager():
+    store = SharedStore()
+
+    async def main():
+        owner = JobManager(workers=1, store=store, store_poll_seconds=0.01)
+        other = JobManager(workers=1, store=store, store_poll_seconds=0.01)
+
+        async def run():
+            await asyncio.sleep(0.05)
+            return {"prediction": "glioma"}
+
+        try:
+            job = await owner.submit("mri", run, user_id=7)
+            seen = await other.find(job.id)
+            assert seen is not None and seen.user_id == 7 and not seen.done
+            finished = await other.wait(seen, 2)
+            return finished, await other.find("missing")
+        finally:
+            await owner.close()
+
+    finished, missing = asyncio.run(main())
+    assert finished.state == "succeeded"
+    assert finished.to_dict()["result"] == {"prediction": "glioma"}
+    assert missing is None
+
+
+def test_wait_on_a_job_from_another_manager_times_out_while_running():
+    store = SharedStore()
+
+    async def main():
+        owner = JobManager(workers=1, store=store, store_poll_seconds=0.01)
+        other = JobManager(workers=1, store=store, store_poll_seconds=0.01)
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+            return 1
+
+        try:
+            job = await owner.submit("ckd", run)
+            still_running = await other.wait(await other.find(job.id), 0.05)
+            release.set()
+            finished = await other.wait(still_running, 2)
+            return still_running.done, finished.state
+        finally:
+            await owner.close()
+
+    assert asyncio.run(main()) == (False, "succeeded")